@@ -0,0 +1,372 @@
+"""
+Throughput and memory benchmark of the preprocessing modules of exercises 1 and 3.
+
+Runs every stage, and the whole pipelines, on a synthetic IMDB-like corpus, and
+reports docs/sec, tokens/sec (whitespace-separated tokens of the input) and
+the increase of the peak RSS for each of them. Runs offline, from the repository root:
+
+    python benchmarks/preprocessing_benchmark.py --n-docs 2000 --output new.json
+    python benchmarks/preprocessing_benchmark.py --baseline new.json
+
+With `--baseline`, exits with status 1 if a stage got slower than the baseline
+by more than `--tolerance`.
+"""
+
+import argparse
+import gc
+import importlib.util
+import itertools
+import json
+import math
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# --- Synthetic corpus ---
+
+COMMON_WORDS = (
+    "the a and of to is in it this that was as for with movie film but on not "
+    "you are his have he be one all at by an who they from like so her just "
+    "about if has out what some good there more when very up no time she even "
+    "my would which only story really see their had can were me we than much "
+    "been get will do other also bad into people great because how most him "
+    "made its then way make could any them too movies after think characters "
+    "character watch two films seen many being plot never love acting life "
+    "where best did know ever over does better why well off still end here man "
+    "scene while these say something scenes go back through real watching doesn't "
+    "don't i'm it's can't didn't actors director funny"
+).split()
+PUNCTUATION = list(",,,,...!?;:") + ['"', "'", "(", ")", "--", "..."]
+NON_ASCII_WORDS = [
+    "caf\xe9",
+    "na\xefve",
+    "\xe9l\xe8ve",
+    "\x96",
+    "\x97",
+    "\x85",
+    "\xb4s",
+]
+HTML_SNIPPETS = ["<br /><br />", "<br />", "<i>", "</i>", "&amp;", "<3"]
+
+
+def generate_corpus(
+    n_docs: int,
+    mean_words: int = 230,
+    html_density: float = 0.3,
+    punctuation_density: float = 0.15,
+    non_ascii_density: float = 0.01,
+    seed: int = 0,
+) -> list[str]:
+    """
+    Generates IMDB-like reviews: Zipfian words, sentences with punctuation,
+    numbers and hyphenated words, `<br />` tags between sentences, and a few
+    non-ASCII characters.
+
+    Args:
+        n_docs: Number of reviews.
+        mean_words: Mean number of words of a review (log-normal lengths).
+        html_density: Probability of an HTML snippet after a sentence.
+        punctuation_density: Probability of a punctuation mark after a word.
+        non_ascii_density: Probability of a word with non-ASCII characters.
+        seed: Seed of the generator, the same seed giving the same corpus.
+    """
+    rng = random.Random(seed)
+    rare_words = [
+        "".join(rng.choices("etaoinshrdlucmfwypvbgkjqxz", k=rng.randint(3, 11)))
+        for _ in range(20_000)
+    ]
+    vocabulary = COMMON_WORDS + rare_words
+    cumulative_weights = list(
+        itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary)))
+    )
+
+    documents = []
+    for _ in range(n_docs):
+        n_words = max(5, int(rng.lognormvariate(math.log(mean_words) - 0.18, 0.6)))
+        words = rng.choices(vocabulary, cum_weights=cumulative_weights, k=n_words)
+        parts = []
+        sentence_start = True
+        for word in words:
+            roll = rng.random()
+            if roll < non_ascii_density:
+                word = rng.choice(NON_ASCII_WORDS)
+            elif roll < non_ascii_density + 0.01:
+                word = rng.choice(["10/10", "1999", "7", "$100", "2nd", "3.5"])
+            elif roll < non_ascii_density + 0.02:
+                word = f"{word}-{rng.choice(COMMON_WORDS)}"
+            if sentence_start:
+                word = word.capitalize()
+                sentence_start = False
+            if rng.random() < punctuation_density:
+                mark = rng.choice(PUNCTUATION)
+                word = f"({word})" if mark in "()" else word + mark
+                if mark in ".!?...":
+                    sentence_start = True
+                    if rng.random() < html_density:
+                        word += " " + rng.choice(HTML_SNIPPETS)
+            parts.append(word)
+        documents.append(" ".join(parts))
+    return documents
+
+
+_corpus = generate_corpus(20, seed=1)
+assert _corpus == generate_corpus(20, seed=1) != generate_corpus(20, seed=2)
+assert all(document.strip() for document in _corpus)
+assert not any("<br" in document for document in generate_corpus(20, html_density=0))
+assert any("<br" in document for document in generate_corpus(50, html_density=1))
+
+
+# --- Measurements ---
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the peak RSS of the process (Linux only). Returns False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _process_status_bytes(field: str) -> int | None:
+    """A size of `/proc/self/status` (Linux only), e.g. "VmRSS", in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _rss_bytes() -> int:
+    """Current RSS of the process, or 0 if unknown."""
+    return _process_status_bytes("VmRSS") or 0
+
+
+def _peak_rss_bytes() -> int:
+    """Peak RSS of the process since the last reset (or since it started)."""
+    peak_rss = _process_status_bytes("VmHWM")
+    if peak_rss is not None:
+        return peak_rss
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def measure(
+    run: Callable[[list[str]], object], documents: list[str], repeat: int
+) -> dict:
+    """
+    Runs `run(documents)` `repeat` times and keeps the fastest run.
+
+    Returns:
+        The seconds, docs/sec, tokens/sec and peak RSS increase of the stage:
+        its peak RSS minus the RSS before it ran, in bytes. Without a way to
+        reset the peak RSS (`peak_rss_is_per_stage` is False), the peak is the
+        one of the whole process so far.
+    """
+    n_tokens = sum(len(document.split()) for document in documents)
+    gc.collect()
+    rss_is_per_stage = _reset_peak_rss()
+    start_rss = _rss_bytes()
+    best_seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(documents)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    return dict(
+        seconds=best_seconds,
+        docs_per_sec=len(documents) / best_seconds,
+        tokens_per_sec=n_tokens / best_seconds,
+        peak_rss_increase_bytes=max(0, _peak_rss_bytes() - start_rss),
+        peak_rss_is_per_stage=rss_is_per_stage,
+    )
+
+
+# --- Stages ---
+
+
+def _load_module(directory: Path, name: str) -> ModuleType:
+    """
+    Imports `<directory>/<name>.py` under the name `<directory name>_<name>`,
+    with its directory on the path (like in the notebooks).
+
+    The modules it imports from its directory (e.g. `bpe` for `preprocessing`)
+    are only in `sys.modules` while it is executed, and modules of the same
+    names imported before are set aside meanwhile, so that the modules of
+    different exercises each import their own siblings.
+    """
+    siblings = {path.stem for path in directory.glob("*.py")}
+    set_aside = {
+        sibling: sys.modules.pop(sibling) for sibling in siblings & set(sys.modules)
+    }
+    spec = importlib.util.spec_from_file_location(
+        f"{directory.name}_{name}", directory / f"{name}.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(directory))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(directory))
+        for sibling in siblings:
+            sys.modules.pop(sibling, None)
+        sys.modules.update(set_aside)
+    return module
+
+
+# Two directories whose modules import a sibling of the same name
+with tempfile.TemporaryDirectory() as _tmp_dir:
+    for _value in [1, 2]:
+        _directory = Path(_tmp_dir) / f"exercise_{_value}"
+        _directory.mkdir()
+        (_directory / "sibling.py").write_text(f"VALUE = {_value}")
+        (_directory / "stage.py").write_text("from sibling import VALUE")
+    assert _load_module(Path(_tmp_dir) / "exercise_1", "stage").VALUE == 1
+    assert _load_module(Path(_tmp_dir) / "exercise_2", "stage").VALUE == 2
+    assert "sibling" not in sys.modules
+
+
+def _per_document(function: Callable[[str], object]) -> Callable[[list[str]], None]:
+    def run(documents: list[str]) -> None:
+        for document in documents:
+            function(document)
+
+    return run
+
+
+def get_stages() -> dict[str, Callable[[list[str]], object]]:
+    """The benchmarked stages, by name, each running on a whole corpus."""
+    ex01 = _load_module(REPO_ROOT / "exercise_01", "preprocessing")
+    ex03 = _load_module(REPO_ROOT / "exercise_03", "preprocessing")
+
+    def ex01_pipeline(documents: list[str]) -> None:
+        stemmer = ex01.CachingStemmer()
+        for document in documents:
+            ex01.full_preprocess_document(document, stemmer_instance=stemmer)
+
+    return {
+        "exercise_01.clean_html_tags": _per_document(ex01.clean_html_tags),
+        "exercise_01.get_rid_of_non_alphanumeric_characters": _per_document(
+            ex01.get_rid_of_non_alphanumeric_characters
+        ),
+        "exercise_01.keep_or_remove_dashes": _per_document(ex01.keep_or_remove_dashes),
+        "exercise_01.full_preprocess_document": ex01_pipeline,
+        "exercise_03._remove_non_printable": _per_document(ex03._remove_non_printable),
+        "exercise_03._remove_html_tags": _per_document(ex03._remove_html_tags),
+        "exercise_03._tokenize_text": _per_document(
+            lambda document: ex03._tokenize_text(document, True)
+        ),
+        "exercise_03.preprocess": ex03.preprocess,
+        "exercise_03.preprocess(to_lowercase, high_freq_term_threshold)": (
+            lambda documents: ex03.preprocess(
+                documents, to_lowercase=True, high_freq_term_threshold=0.01
+            )
+        ),
+        "exercise_03.preprocess(remove_punctuation_tokens, number_token)": (
+            lambda documents: ex03.preprocess(
+                documents,
+                remove_punctuation_tokens=True,
+                number_replacement_token="NUMTOKEN",
+            )
+        ),
+    }
+
+
+# --- Reports ---
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Returns the stages whose docs/sec dropped by more than `tolerance` (e.g.
+    0.2 for 20%) compared to the baseline.
+    """
+    regressions = []
+    for stage, result in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        ratio = result["docs_per_sec"] / baseline["stages"][stage]["docs_per_sec"]
+        print(f"{stage:<66} {ratio:6.2f}x baseline")
+        if ratio < 1 - tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-docs", type=int, default=2000)
+    parser.add_argument("--mean-words", type=int, default=230)
+    parser.add_argument("--html-density", type=float, default=0.3)
+    parser.add_argument("--punctuation-density", type=float, default=0.15)
+    parser.add_argument("--non-ascii-density", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--stages", nargs="*", help="Only run the stages containing these strings."
+    )
+    parser.add_argument("--output", type=Path, help="Writes the results as JSON.")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare to.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    corpus_options = dict(
+        n_docs=args.n_docs,
+        mean_words=args.mean_words,
+        html_density=args.html_density,
+        punctuation_density=args.punctuation_density,
+        non_ascii_density=args.non_ascii_density,
+        seed=args.seed,
+    )
+    documents = generate_corpus(**corpus_options)
+
+    results = dict(
+        corpus=dict(
+            corpus_options,
+            n_tokens=sum(len(document.split()) for document in documents),
+            n_bytes=sum(len(document.encode()) for document in documents),
+        ),
+        environment=dict(
+            python=platform.python_version(),
+            platform=platform.platform(),
+            machine=platform.machine(),
+        ),
+        repeat=args.repeat,
+        stages={},
+    )
+    for stage, run in get_stages().items():
+        if args.stages and not any(pattern in stage for pattern in args.stages):
+            continue
+        result = measure(run, documents, args.repeat)
+        results["stages"][stage] = result
+        print(
+            f"{stage:<66} {result['docs_per_sec']:>10.0f} docs/s "
+            f"{result['tokens_per_sec']:>12.0f} tokens/s "
+            f"{result['peak_rss_increase_bytes'] / 2**20:>+8.1f} MiB"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# Modules shared by the exercises, imported as `common.<module>` with the root of
+# the repository on the path
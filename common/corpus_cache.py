@@ -0,0 +1,277 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Callable, Sequence
+
+# Shard file layout (all integers little-endian):
+#   - SHARD_MAGIC
+#   - Number of documents n, as an uint64
+#   - The n keys, KEY_SIZE bytes each
+#   - n + 1 uint64 offsets of the documents in the blob
+#   - Blob: the tokens of every document, UTF-8 encoded, each followed by "\n"
+#     (so that a document [""] is not confused with an empty one)
+SHARD_MAGIC = b"DLNLPCS2"
+KEY_SIZE = 16
+_SHARD_SUFFIX = ".shard"
+
+
+def _write_shard(
+    path: Path, keys: list[bytes], documents_tokens: list[list[str]]
+) -> None:
+    """Writes a shard through a temporary file, so readers never see half of it."""
+    blobs = []
+    for tokens in documents_tokens:
+        if any("\n" in token for token in tokens):
+            raise ValueError("Tokens containing a newline cannot be cached.")
+        text = "\n".join(tokens) + "\n" if tokens else ""
+        blobs.append(text.encode("utf-8", "surrogatepass"))
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(SHARD_MAGIC)
+        f.write(struct.pack("<Q", len(keys)))
+        f.write(b"".join(keys))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(b"".join(blobs))
+    os.replace(tmp_path, path)
+
+
+def _read_shard_index(path: Path) -> dict[bytes, tuple[int, int]]:
+    """
+    Reads the keys and offsets of a shard, without its blob.
+
+    Returns:
+        The start and end position in the file of the tokens of each key.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(SHARD_MAGIC)) != SHARD_MAGIC:
+            raise ValueError(f"{path} is not a cache shard.")
+        (n_documents,) = struct.unpack("<Q", f.read(8))
+        keys = f.read(n_documents * KEY_SIZE)
+        offsets = struct.unpack(f"<{n_documents + 1}Q", f.read(8 * (n_documents + 1)))
+    blob_start = len(SHARD_MAGIC) + 8 + n_documents * (KEY_SIZE + 8) + 8
+    return {
+        keys[i * KEY_SIZE : (i + 1) * KEY_SIZE]: (
+            blob_start + offsets[i],
+            blob_start + offsets[i + 1],
+        )
+        for i in range(n_documents)
+    }
+
+
+class CorpusCache:
+    """
+    Content-addressed on-disk cache of the tokens of pre-processed documents.
+
+    A document is identified by a hash of its text and of the options it was
+    pre-processed with (which should include a version of the pre-processing
+    code), so a changed document, option or function never reuses stale
+    tokens. Each call to `map` writes the documents it had to process as one
+    binary shard file. When the shards take more than `max_bytes`, the least
+    recently used ones are deleted.
+
+    Args:
+        cache_dir: Directory of the shards. Created if needed.
+        max_bytes: Maximum total size of the shards. If None, nothing is ever
+            evicted.
+
+    Attributes:
+        hits: Number of documents read from the cache.
+        misses: Number of documents that had to be processed.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int | None = 2**30):
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes must be non-negative, or None.")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # key -> (shard path, start, end)
+        self._index: dict[bytes, tuple[Path, int, int]] = {}
+        # Oldest shards first, so that newer shards win on duplicate keys
+        for shard_path in sorted(self._shard_paths(), key=os.path.getmtime):
+            try:
+                shard_index = _read_shard_index(shard_path)
+            except ValueError:
+                shard_path.unlink()  # Written in another format
+                continue
+            for key, (start, end) in shard_index.items():
+                self._index[key] = (shard_path, start, end)
+
+    def _shard_paths(self) -> list[Path]:
+        return list(self.cache_dir.glob(f"*{_SHARD_SUFFIX}"))
+
+    def __len__(self) -> int:
+        """Number of cached documents."""
+        return len(self._index)
+
+    def nbytes(self) -> int:
+        """Total size of the shards, in bytes."""
+        return sum(path.stat().st_size for path in self._shard_paths())
+
+    @staticmethod
+    def _keys(documents: Sequence[str], options: dict) -> list[bytes]:
+        options_digest = hashlib.sha256(
+            json.dumps(options, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).digest()
+        keys = []
+        for document in documents:
+            key = hashlib.blake2b(options_digest, digest_size=KEY_SIZE)
+            key.update(document.encode("utf-8", "surrogatepass"))
+            keys.append(key.digest())
+        return keys
+
+    def map(
+        self,
+        process: Callable[[list[str]], list[list[str]]],
+        documents: Sequence[str],
+        options: dict,
+    ) -> list[list[str]]:
+        """
+        Returns the tokens of every document, calling `process` only on the
+        documents that are not cached yet (once per distinct document), and
+        not at all when they are all cached.
+
+        Args:
+            process: Pre-processes a list of documents into their tokens.
+            documents: The raw documents.
+            options: JSON-serializable description of everything `process`
+                depends on besides the documents: its options and the
+                version of its code.
+
+        Returns:
+            The tokens of each document, in the order of `documents`.
+        """
+        keys = self._keys(documents, options)
+        results: list[list[str] | None] = [None] * len(documents)
+
+        # Read the cached documents, one shard at a time
+        by_shard: dict[Path, list[int]] = {}
+        missing: dict[bytes, list[int]] = {}
+        for i, key in enumerate(keys):
+            entry = self._index.get(key)
+            if entry is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                by_shard.setdefault(entry[0], []).append(i)
+        for shard_path, positions in by_shard.items():
+            with (
+                open(shard_path, "rb") as f,
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as shard,
+            ):
+                for i in positions:
+                    _, start, end = self._index[keys[i]]
+                    text = shard[start:end].decode("utf-8", "surrogatepass")
+                    results[i] = text[:-1].split("\n") if text else []
+            os.utime(shard_path)  # Recently used
+        self.hits += len(documents) - sum(map(len, missing.values()))
+
+        if missing:
+            missing_keys = list(missing)
+            missing_tokens = process([documents[missing[key][0]] for key in missing])
+            if len(missing_tokens) != len(missing_keys):
+                raise ValueError("process must return one token list per document.")
+            for key, tokens in zip(missing_keys, missing_tokens):
+                first, *duplicates = missing[key]
+                results[first] = tokens
+                for i in duplicates:
+                    results[i] = list(tokens)
+            self.misses += sum(map(len, missing.values()))
+
+            shard_name = hashlib.blake2b(b"".join(missing_keys), digest_size=16)
+            shard_path = self.cache_dir / (shard_name.hexdigest() + _SHARD_SUFFIX)
+            _write_shard(shard_path, missing_keys, missing_tokens)
+            for key, (start, end) in _read_shard_index(shard_path).items():
+                self._index[key] = (shard_path, start, end)
+            self._evict(keep=shard_path)
+
+        return results  # type: ignore[return-value]
+
+    def _evict(self, keep: Path | None = None) -> None:
+        """Deletes the least recently used shards until they fit in `max_bytes`."""
+        if self.max_bytes is None:
+            return
+        shards = sorted(
+            ((path.stat().st_mtime_ns, path) for path in self._shard_paths()),
+            key=lambda item: item[0],
+        )
+        total = sum(path.stat().st_size for _, path in shards)
+        for _, path in shards:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            total -= path.stat().st_size
+            path.unlink()
+            self._index = {
+                key: entry for key, entry in self._index.items() if entry[0] != path
+            }
+
+    def clear(self) -> None:
+        """Deletes every shard."""
+        for path in self._shard_paths():
+            path.unlink()
+        self._index = {}
+
+
+# Tests for CorpusCache
+_processed_documents: list[str] = []
+
+
+def _split_documents(documents: list[str]) -> list[list[str]]:
+    _processed_documents.extend(documents)
+    return [document.split() for document in documents]
+
+
+with tempfile.TemporaryDirectory() as _cache_dir:
+    _cache = CorpusCache(_cache_dir)
+    _documents = ["a b", "c", "", "a b", "d\xe9 e"]
+    _expected = [["a", "b"], ["c"], [], ["a", "b"], ["d\xe9", "e"]]
+    assert _cache.map(_split_documents, _documents, {"v": 1}) == _expected
+    assert _processed_documents == ["a b", "c", "", "d\xe9 e"]  # Deduplicated
+    assert (_cache.hits, _cache.misses, len(_cache)) == (0, 5, 4)
+
+    # Everything is cached: nothing is processed, also after reopening the cache
+    _processed_documents.clear()
+    _cache = CorpusCache(_cache_dir)
+    assert _cache.map(_split_documents, _documents, {"v": 1}) == _expected
+    assert _processed_documents == [] and _cache.hits == 5
+
+    # Only the new or changed documents are processed
+    assert _cache.map(_split_documents, ["c", "f g"], {"v": 1}) == [["c"], ["f", "g"]]
+    assert _processed_documents == ["f g"]
+
+    # Other options do not reuse the cached tokens
+    _processed_documents.clear()
+    _cache.map(_split_documents, ["c"], {"v": 2})
+    assert _processed_documents == ["c"]
+
+    # Empty tokens are kept, also when read back from the shards
+    _tokens = [[""], ["", "a", ""], []]
+    assert _cache.map(lambda _: _tokens, ["x", "y", "z"], {"v": 3}) == _tokens
+    assert CorpusCache(_cache_dir).map(_split_documents, ["x", "y", "z"], {"v": 3}) == (
+        _tokens
+    )
+
+    # Shards of another format are deleted
+    (Path(_cache_dir) / "old.shard").write_bytes(b"DLNLPCS1" + bytes(8))
+    assert len(CorpusCache(_cache_dir)) == len(_cache)
+    assert not (Path(_cache_dir) / "old.shard").exists()
+
+    # Eviction of the least recently used shards
+    _cache.max_bytes = 0
+    _cache.map(_split_documents, ["h"], {"v": 1})
+    assert len(list(Path(_cache_dir).glob("*.shard"))) == 1
+    assert len(_cache) == 1 and _cache.map(_split_documents, ["h"], {"v": 1}) == [["h"]]
+
+    _cache.clear()
+    assert len(_cache) == 0 and _cache.nbytes() == 0
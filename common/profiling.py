@@ -0,0 +1,137 @@
+import contextlib
+import time
+from array import array
+from typing import Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# Profilers enabled with `profile`, the innermost one last
+_active_profilers: list["StageProfiler"] = []
+
+
+def _count_tokens(value) -> int:
+    """
+    Number of tokens of a stage input or output: whitespace-separated words
+    for a text, items for a list of tokens (or of IDs), and the total over
+    documents for a corpus.
+    """
+    if isinstance(value, str):
+        return len(value.split())
+    if len(value) == 0:
+        return 0
+    first = next(iter(value))
+    if isinstance(first, str) or not hasattr(first, "__len__"):  # Tokens or IDs
+        return len(value)
+    return sum(map(_count_tokens, value))
+
+
+assert _count_tokens("a b  c") == 3
+assert _count_tokens(["a", "b"]) == 2 and _count_tokens([]) == 0
+assert _count_tokens([["a"], [], ["b", "c"]]) == 3
+assert _count_tokens([array("i", [1, 2]), array("i", [3])]) == 3
+
+
+class StageProfiler:
+    """
+    Records, for each stage of a pipeline, its number of calls, its cumulative
+    wall time, and the number of tokens it received and returned (so that the
+    tokens dropped by a stage show up as tokens_in - tokens_out).
+
+    The pipelines only look for a profiler once per document, and run their
+    fused fast path when none is enabled, so profiling costs nothing unless it
+    is turned on with `profile`.
+    """
+
+    def __init__(self):
+        # stage -> [calls, seconds, tokens_in, tokens_out]
+        self._stages: dict[str, list] = {}
+
+    def run(self, stage: str, function: Callable[..., T], value, *args) -> T:
+        """Returns `function(value, *args)`, recorded as a call of `stage`."""
+        start = time.perf_counter()
+        output = function(value, *args)
+        seconds = time.perf_counter() - start
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages[stage] = [0, 0.0, 0, 0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += _count_tokens(value)
+        stats[3] += _count_tokens(output)
+        return output
+
+    def reset(self) -> None:
+        """Forgets every recorded call."""
+        self._stages = {}
+
+    def to_dict(self) -> dict[str, dict[str, float]]:
+        """The statistics of every stage, in the order the stages first ran."""
+        return {
+            stage: dict(
+                calls=calls, seconds=seconds, tokens_in=tokens_in, tokens_out=tokens_out
+            )
+            for stage, (calls, seconds, tokens_in, tokens_out) in self._stages.items()
+        }
+
+    def to_prometheus(self, prefix: str = "preprocessing") -> str:
+        """The statistics in the Prometheus text exposition format."""
+        metrics = [
+            ("stage_calls_total", "Number of calls of each stage.", 0),
+            ("stage_seconds_total", "Cumulative wall time of each stage.", 1),
+            ("stage_tokens_in_total", "Tokens received by each stage.", 2),
+            ("stage_tokens_out_total", "Tokens returned by each stage.", 3),
+        ]
+        lines = []
+        for name, description, index in metrics:
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for stage, stats in self._stages.items():
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {stats[index]}')
+        return "\n".join(lines) + "\n"
+
+
+def current_profiler() -> StageProfiler | None:
+    """The profiler enabled by the innermost `profile` block, if any."""
+    return _active_profilers[-1] if _active_profilers else None
+
+
+@contextlib.contextmanager
+def profile(profiler: StageProfiler | None = None) -> Iterator[StageProfiler]:
+    """
+    Enables a profiler for the pipelines run inside the `with` block (in the
+    current process only: worker processes are not profiled).
+
+    Example:
+        with profile() as profiler:
+            preprocess(reviews)
+        print(profiler.to_prometheus())
+
+    Args:
+        profiler: The profiler to enable, e.g. to accumulate statistics over
+            several blocks. Defaults to a new one.
+    """
+    profiler = profiler if profiler is not None else StageProfiler()
+    _active_profilers.append(profiler)
+    try:
+        yield profiler
+    finally:
+        _active_profilers.remove(profiler)
+
+
+# Tests for StageProfiler
+assert current_profiler() is None
+with profile() as _profiler:
+    assert current_profiler() is _profiler
+    assert _profiler.run("split", str.split, "a b c") == ["a", "b", "c"]
+    _profiler.run("split", str.split, "d")
+    _profiler.run("drop", lambda tokens: tokens[1:], ["a", "b"])
+assert current_profiler() is None
+
+_stats = _profiler.to_dict()
+assert list(_stats) == ["split", "drop"]
+assert {k: v for k, v in _stats["split"].items() if k != "seconds"} == dict(
+    calls=2, tokens_in=4, tokens_out=4
+)
+assert (_stats["drop"]["tokens_in"], _stats["drop"]["tokens_out"]) == (2, 1)
+assert 'preprocessing_stage_calls_total{stage="split"} 2\n' in _profiler.to_prometheus()
+assert "# TYPE preprocessing_stage_seconds_total counter" in _profiler.to_prometheus()
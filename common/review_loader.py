@@ -0,0 +1,560 @@
+import collections
+import concurrent.futures
+import mmap
+import os
+import pickle
+import random
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Sequence, overload
+
+# Archive file layout (all integers little-endian, arrays 8-byte aligned):
+#   - ARCHIVE_MAGIC
+#   - Number of reviews n, as an uint64
+#   - n + 1 uint64 offsets of the reviews in the blob
+#   - n int32 labels (the ratings of the file names), padded to 8 bytes
+#   - Blob: the texts of every review, UTF-8 encoded, one after the other
+ARCHIVE_MAGIC = b"DLNLPRA1"
+_HEADER_SIZE = len(ARCHIVE_MAGIC) + 8
+
+# Default number of files being read at the same time
+MAX_IN_FLIGHT = 32
+
+
+class ReviewFile(NamedTuple):
+    """A review file of the IMDB dataset, named `{id}_{label}.txt`."""
+
+    path: Path
+    id: int
+    label: int
+
+
+def parse_review_filename(name: str) -> tuple[int, int]:
+    """
+    Parses a review file name of the form `{id}_{label}.txt`.
+
+    Returns:
+        The ID and the label (rating from 1 to 10) of the review.
+
+    Raises:
+        ValueError: If the name does not have this form.
+    """
+    stem, dot, extension = name.rpartition(".")
+    review_id, _, label = stem.partition("_")
+    if not (dot and extension == "txt" and review_id.isdecimal() and label.isdecimal()):
+        raise ValueError(f"{name!r} is not named '{{id}}_{{label}}.txt'.")
+    return int(review_id), int(label)
+
+
+assert parse_review_filename("123_7.txt") == (123, 7)
+assert parse_review_filename("0_10.txt") == (0, 10)
+for _name in ["123_7", "123.txt", "a_7.txt", "1_2_3.txt", "1_7.txt.bak"]:
+    try:
+        parse_review_filename(_name)
+        assert False, f"ValueError not raised for {_name!r}"
+    except ValueError:
+        pass  # Expected
+
+
+def list_review_files(
+    data_path: str | Path, subdirectories: Iterable[str] = ("pos", "neg")
+) -> list[ReviewFile]:
+    """
+    Lists the review files of a split of the dataset (e.g. "aclImdb/train"),
+    subdirectory by subdirectory, sorted by ID within a subdirectory.
+
+    Raises:
+        FileNotFoundError: If a subdirectory does not exist.
+        ValueError: If a `.txt` file is not named `{id}_{label}.txt`.
+    """
+    review_files = []
+    for subdirectory in subdirectories:
+        directory = Path(data_path) / subdirectory
+        if not directory.is_dir():
+            raise FileNotFoundError(f"Path {directory} does not exist.")
+        files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt"):
+                    review_id, label = parse_review_filename(entry.name)
+                    files.append(ReviewFile(Path(entry.path), review_id, label))
+        files.sort(key=lambda review_file: review_file.id)
+        review_files.extend(files)
+    return review_files
+
+
+def read_texts(
+    paths: Iterable[str | Path], max_in_flight: int = MAX_IN_FLIGHT
+) -> Iterator[str]:
+    """
+    Reads text files with a pool of threads, and yields their contents in the
+    order of `paths`.
+
+    At most `max_in_flight` files are being read (or waiting to be yielded)
+    at the same time, so that the latency of each read (e.g. on a network
+    file system) is overlapped with the others, while memory stays bounded
+    however many files there are.
+
+    Args:
+        paths: The files, UTF-8 encoded. Consumed lazily.
+        max_in_flight: Maximum number of reads in flight. With 1, the files
+            are read one at a time in the current thread.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1.")
+    if max_in_flight == 1:
+        for path in paths:
+            yield Path(path).read_text(encoding="utf-8")
+        return
+
+    paths = iter(paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight: collections.deque[concurrent.futures.Future] = collections.deque()
+        for path in paths:
+            in_flight.append(pool.submit(Path.read_text, Path(path), "utf-8"))
+            if len(in_flight) == max_in_flight:
+                break
+        while in_flight:
+            text = in_flight.popleft().result()
+            # Start the next read before handing this text over
+            for path in paths:
+                in_flight.append(pool.submit(Path.read_text, Path(path), "utf-8"))
+                break
+            yield text
+
+
+def load_reviews(
+    data_path: str | Path,
+    subdirectories: Iterable[str] = ("pos", "neg"),
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> Iterator[tuple[str, int]]:
+    """
+    Streams the `(text, label)` records of a split of the dataset, in the
+    order of `list_review_files`, e.g. into `preprocess_stream`:
+
+        records = load_reviews("aclImdb/train")
+        texts = (text for text, _ in records)
+
+    If `data_path` is an archive written by `pack_reviews`, its records are
+    read from it instead.
+    """
+    if Path(data_path).is_file():
+        with PackedCorpus(data_path) as corpus:
+            for text, label in corpus.records():
+                yield text, label
+        return
+    review_files = list_review_files(data_path, subdirectories)
+    texts = read_texts((file.path for file in review_files), max_in_flight)
+    for text, review_file in zip(texts, review_files):
+        yield text, review_file.label
+
+
+def _subset_indices(n: int, subset_size: int | None, seed: int) -> Sequence[int]:
+    """The first `subset_size` of the indices below `n`, shuffled with `seed`."""
+    if subset_size is None or subset_size >= n:
+        return range(n)
+    indices = list(range(n))
+    random.Random(seed).shuffle(indices)
+    return indices[:subset_size]
+
+
+def load_imdb_data(
+    data_path: str | Path,
+    binary_labels: bool = False,
+    subset_size: int | None = None,
+    random_seed: int = 42,
+    subdirectories: Iterable[str] = ("pos", "neg"),
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> tuple[list[str], list[int]]:
+    """
+    Loads the reviews and labels of a split of the dataset (e.g.
+    "aclImdb/train", or an archive written by `pack_reviews`).
+
+    Args:
+        data_path: The directory of the split, or an archive.
+        binary_labels: If True, the labels are 1 for positive reviews (rated
+            7 or more) and 0 for negative ones, instead of the ratings.
+        subset_size: If set, only a random subset of that many reviews is
+            loaded (and only their files are read), in a random order.
+        random_seed: Seed of the random subset, the same seed giving the same
+            subset.
+        subdirectories: The subdirectories of the split to load.
+        max_in_flight: See `read_texts`.
+
+    Returns:
+        The texts of the reviews, and their labels.
+    """
+    if Path(data_path).is_file():
+        with PackedCorpus(data_path) as corpus:
+            indices = _subset_indices(len(corpus), subset_size, random_seed)
+            texts = [corpus[i] for i in indices]
+            ratings = [corpus.labels[i] for i in indices]
+    else:
+        review_files = list_review_files(data_path, subdirectories)
+        indices = _subset_indices(len(review_files), subset_size, random_seed)
+        review_files = [review_files[i] for i in indices]
+        texts = list(read_texts((file.path for file in review_files), max_in_flight))
+        ratings = [review_file.label for review_file in review_files]
+    if binary_labels:
+        return texts, [int(rating > 5) for rating in ratings]
+    return texts, ratings
+
+
+# --- Archives ---
+
+
+def _labels_size(n_documents: int) -> int:
+    """Size of the int32 labels of an archive, padded to 8 bytes."""
+    return 4 * n_documents + (4 * n_documents) % 8
+
+
+def pack_texts(
+    archive_path: str | Path, texts: Iterable[str], labels: Sequence[int]
+) -> int:
+    """
+    Writes texts and their labels as an archive (see `ARCHIVE_MAGIC`), which
+    `read_archive` loads in one sequential read and `PackedCorpus` maps in
+    memory. The texts are streamed into the archive, which is written
+    through a temporary file.
+
+    Args:
+        archive_path: The archive to write.
+        texts: The texts, consumed lazily.
+        labels: The label of each text, which also gives the number of texts.
+
+    Returns:
+        The number of packed texts.
+
+    Raises:
+        ValueError: If there are not as many texts as labels.
+    """
+    n_documents = len(labels)
+    labels_array = array("i", labels)
+    blob_start = _HEADER_SIZE + 8 * (n_documents + 1) + _labels_size(n_documents)
+
+    archive_path = Path(archive_path)
+    tmp_path = archive_path.with_suffix(archive_path.suffix + ".tmp")
+    offsets = array("Q", [0])
+    try:
+        with open(tmp_path, "wb") as f:
+            f.seek(blob_start)
+            for text in texts:
+                offsets.append(offsets[-1] + f.write(text.encode("utf-8")))
+            if len(offsets) != n_documents + 1:
+                raise ValueError(
+                    f"Got {len(offsets) - 1} texts for {n_documents} labels."
+                )
+            f.seek(0)
+            f.write(ARCHIVE_MAGIC)
+            f.write(struct.pack("<Q", n_documents))
+            if sys.byteorder != "little":
+                offsets.byteswap()
+                labels_array.byteswap()
+            f.write(offsets.tobytes())
+            f.write(labels_array.tobytes().ljust(_labels_size(n_documents), b"\0"))
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        # E.g. bad texts, or an interrupted stream: drop the partial archive
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return n_documents
+
+
+def pack_token_lists(
+    archive_path: str | Path, token_lists: Iterable[list[str]], labels: Sequence[int]
+) -> int:
+    """
+    Same as `pack_texts` for pre-processed documents, whose tokens are
+    joined with spaces (see `PackedCorpus.token_lists`).
+
+    Raises:
+        ValueError: If a token is empty or contains whitespace.
+    """
+
+    def texts() -> Iterator[str]:
+        for tokens in token_lists:
+            text = " ".join(tokens)
+            if text.split() != tokens:
+                raise ValueError("Tokens cannot be empty or contain whitespace.")
+            yield text
+
+    return pack_texts(archive_path, texts(), labels)
+
+
+def pack_reviews(
+    data_path: str | Path,
+    archive_path: str | Path,
+    subdirectories: Iterable[str] = ("pos", "neg"),
+    max_in_flight: int = MAX_IN_FLIGHT,
+) -> int:
+    """
+    Packs the review files of a split of the dataset into a single archive
+    file, so that later loads are one sequential read (or one `mmap`)
+    instead of one open and read per file.
+
+    Returns:
+        The number of packed reviews.
+    """
+    review_files = list_review_files(data_path, subdirectories)
+    texts = read_texts((file.path for file in review_files), max_in_flight)
+    return pack_texts(
+        archive_path, texts, [review_file.label for review_file in review_files]
+    )
+
+
+def read_archive(archive_path: str | Path) -> tuple[list[str], list[int]]:
+    """
+    Reads an archive written by `pack_texts`, in one sequential read.
+
+    Returns:
+        The texts, and their labels.
+    """
+    data = memoryview(Path(archive_path).read_bytes())
+    if data[: len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+        raise ValueError(f"{archive_path} is not a review archive.")
+    (n_documents,) = struct.unpack_from("<Q", data, len(ARCHIVE_MAGIC))
+    offsets_end = _HEADER_SIZE + 8 * (n_documents + 1)
+    offsets = array("Q")
+    offsets.frombytes(data[_HEADER_SIZE:offsets_end])
+    labels = array("i")
+    labels.frombytes(data[offsets_end : offsets_end + 4 * n_documents])
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        labels.byteswap()
+    blob = data[offsets_end + _labels_size(n_documents) :]
+    texts = [str(blob[start:end], "utf-8") for start, end in zip(offsets, offsets[1:])]
+    return texts, labels.tolist()
+
+
+class PackedCorpus:
+    """
+    Read-only sequence of the texts of an archive written by `pack_texts`
+    (or `pack_reviews`), mapped in memory.
+
+    Opening the archive only reads its header: the offsets, labels and texts
+    are paged in by the OS when accessed (and shared by the processes that
+    open the same file), so the whole IMDB corpus opens in milliseconds. Any
+    document is accessed in O(1), as a zero-copy `memoryview` of its UTF-8
+    bytes with `document_bytes`, or decoded with `corpus[i]`.
+
+    It can be passed wherever a list of reviews is expected (`preprocess`,
+    `preprocess_corpus`, `full_preprocess_document` in a loop...), and to
+    the `Dataset` classes of the notebooks, e.g. for an archive of tokens
+    written by `pack_token_lists`:
+
+        corpus = PackedCorpus("train_tokens.reviews")
+        dataset = RNNDataset(corpus.token_lists, corpus.labels, word_to_idx)
+
+    A pickled corpus (e.g. sent to `DataLoader` workers) is reopened from its
+    path.
+
+    Attributes:
+        path: The archive.
+        offsets: The n + 1 offsets of the documents in the blob (uint64).
+        labels: The label of each document (int32).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if view[: len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a review archive.")
+        (n_documents,) = struct.unpack_from("<Q", view, len(ARCHIVE_MAGIC))
+        offsets_end = _HEADER_SIZE + 8 * (n_documents + 1)
+        self.offsets: Sequence[int] = view[_HEADER_SIZE:offsets_end].cast("Q")
+        self.labels: Sequence[int] = view[
+            offsets_end : offsets_end + 4 * n_documents
+        ].cast("i")
+        if sys.byteorder != "little":
+            # Only the index is copied, to swap its bytes
+            self.offsets, self.labels = (
+                array("Q", self.offsets),
+                array("i", self.labels),
+            )
+            self.offsets.byteswap()
+            self.labels.byteswap()
+        self._blob = view[offsets_end + _labels_size(n_documents) :]
+        self._view = view
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def document_bytes(self, index: int) -> memoryview:
+        """The UTF-8 bytes of a document, without copying them."""
+        return self._blob[self.offsets[index] : self.offsets[index + 1]]
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        index = range(len(self))[index]  # Negative indices, and IndexError
+        return str(self.document_bytes(index), "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield str(self.document_bytes(index), "utf-8")
+
+    def records(self) -> Iterator[tuple[str, int]]:
+        """The `(text, label)` of each document."""
+        return zip(self, self.labels)
+
+    @property
+    def token_lists(self) -> "PackedTokenLists":
+        """The documents split on whitespace, as a lazy sequence."""
+        return PackedTokenLists(self)
+
+    def close(self) -> None:
+        """
+        Unmaps the archive. The views returned by `document_bytes` must have
+        been released.
+        """
+        if self._mmap.closed:
+            return
+        for view in (self.offsets, self.labels, self._blob, self._view):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "PackedCorpus":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict) -> None:
+        self.path = state["path"]
+        self._open()
+
+
+class PackedTokenLists:
+    """Sequence of the token lists of the documents of a `PackedCorpus`."""
+
+    def __init__(self, corpus: PackedCorpus):
+        self.corpus = corpus
+
+    def __len__(self) -> int:
+        return len(self.corpus)
+
+    def __getitem__(self, index: int) -> list[str]:
+        return self.corpus[index].split()
+
+    def __iter__(self) -> Iterator[list[str]]:
+        return (text.split() for text in self.corpus)
+
+
+# Tests with a small copy of the dataset layout
+with tempfile.TemporaryDirectory() as _tmp_dir:
+    _split = Path(_tmp_dir) / "train"
+    _reviews = {
+        "pos": {"10_9.txt": "Great <br />movie", "2_7.txt": "caf\xe9 \U0001f600"},
+        "neg": {"5_1.txt": "", "1_4.txt": "Bad.\nVery bad."},
+    }
+    for _subdirectory, _files in _reviews.items():
+        (_split / _subdirectory).mkdir(parents=True)
+        (_split / _subdirectory / "README").write_text("not a review")
+        for _name, _text in _files.items():
+            (_split / _subdirectory / _name).write_text(_text, encoding="utf-8")
+    _expected_texts = ["caf\xe9 \U0001f600", "Great <br />movie", "Bad.\nVery bad.", ""]
+    _expected_labels = [7, 9, 4, 1]
+
+    assert [file.id for file in list_review_files(_split)] == [2, 10, 1, 5]
+    for _max_in_flight in [1, 2, 32]:
+        assert load_imdb_data(_split, max_in_flight=_max_in_flight) == (
+            _expected_texts,
+            _expected_labels,
+        )
+    assert load_imdb_data(_split, binary_labels=True)[1] == [1, 1, 0, 0]
+    assert load_imdb_data(_split, subdirectories=["neg"]) == (
+        _expected_texts[2:],
+        _expected_labels[2:],
+    )
+
+    # Random subsets, shuffled like `random.shuffle` after `random.seed`
+    _subset = load_imdb_data(_split, subset_size=3, random_seed=1)
+    _indices = list(range(4))
+    random.Random(1).shuffle(_indices)
+    assert _subset == (
+        [_expected_texts[i] for i in _indices[:3]],
+        [_expected_labels[i] for i in _indices[:3]],
+    )
+    assert load_imdb_data(_split, subset_size=10) == load_imdb_data(_split)
+    assert list(load_reviews(_split, subdirectories=["neg"])) == [
+        ("Bad.\nVery bad.", 4),
+        ("", 1),
+    ]
+
+    # Lazy reads: consuming the first record reads at most `max_in_flight` files
+    _paths = [file.path for file in list_review_files(_split)]
+    _texts = read_texts(iter(_paths * 100), max_in_flight=3)
+    assert next(_texts) == _expected_texts[0]
+    _texts.close()
+
+    _archive_path = Path(_tmp_dir) / "train.reviews"
+    assert pack_reviews(_split, _archive_path) == 4
+    assert read_archive(_archive_path) == (_expected_texts, _expected_labels)
+    assert load_imdb_data(_archive_path) == (_expected_texts, _expected_labels)
+    assert load_imdb_data(_archive_path, subset_size=3, random_seed=1) == _subset
+
+    # Tests for PackedCorpus
+    with PackedCorpus(_archive_path) as _corpus:
+        assert len(_corpus) == 4 and list(_corpus) == _expected_texts
+        assert list(_corpus.labels) == _expected_labels
+        assert _corpus[1] == _expected_texts[1] and _corpus[-1] == ""
+        assert _corpus[1:3] == _expected_texts[1:3]
+        _document = _corpus.document_bytes(0)
+        assert _document.obj is _corpus._mmap  # Zero-copy
+        assert bytes(_document) == _expected_texts[0].encode("utf-8")
+        _document.release()
+        assert pickle.loads(pickle.dumps(_corpus))[2] == _expected_texts[2]
+        try:
+            _corpus[4]
+            assert False, "IndexError not raised"
+        except IndexError:
+            pass  # Expected
+
+    _token_lists = [["a", "caf\xe9"], [], ["<3", "\U0001f600"]]
+    assert pack_token_lists(_archive_path, _token_lists, [1, 0, 1]) == 3
+    with PackedCorpus(_archive_path) as _corpus:
+        assert _corpus.token_lists[2] == _token_lists[2]
+        assert list(_corpus.token_lists) == _token_lists
+    for _bad_tokens in [[["a b"]], [[""]]]:
+        try:
+            pack_token_lists(_archive_path, _bad_tokens, [0])
+            assert False, "ValueError not raised for tokens with whitespace"
+        except ValueError:
+            pass  # Expected
+    try:
+        pack_texts(_archive_path, ["a", "b"], [0])
+        assert False, "ValueError not raised for more texts than labels"
+    except ValueError:
+        pass  # Expected
+    # The failed packs leave neither a temporary file nor a changed archive
+    assert sorted(Path(_tmp_dir).glob(_archive_path.name + "*")) == [_archive_path]
+    assert read_archive(_archive_path) == (
+        ["a caf\xe9", "", "<3 \U0001f600"],
+        [1, 0, 1],
+    )
+
+    try:
+        list_review_files(Path(_tmp_dir) / "test")
+        assert False, "FileNotFoundError not raised for a missing directory"
+    except FileNotFoundError:
+        pass  # Expected
@@ -0,0 +1,61 @@
+import sys
+from array import array
+from collections.abc import Iterable, Sequence
+
+
+class Vocabulary:
+    """
+    Growable mapping between tokens and integer IDs.
+
+    IDs are assigned in order of first appearance, starting at 0. Tokens are
+    interned with `sys.intern`, so every decoded occurrence of a token is the
+    same string object.
+
+    Args:
+        tokens: Tokens to add to the vocabulary right away.
+    """
+
+    def __init__(self, tokens: Iterable[str] = ()):
+        self.token_to_id: dict[str, int] = {}
+        self.id_to_token: list[str] = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self) -> int:
+        return len(self.id_to_token)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.token_to_id
+
+    def add(self, token: str) -> int:
+        """Returns the ID of `token`, adding it to the vocabulary if needed."""
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token = sys.intern(token)
+            token_id = len(self.id_to_token)
+            self.token_to_id[token] = token_id
+            self.id_to_token.append(token)
+        return token_id
+
+    def encode(self, tokens: Sequence[str]) -> array:
+        """Returns the IDs of `tokens` as an `array('I')`, adding new tokens."""
+        token_to_id = self.token_to_id
+        # `dict.fromkeys` dedupes while keeping the order of first appearance,
+        # so only the distinct tokens of the sequence go through `add`.
+        for token in dict.fromkeys(tokens):
+            if token not in token_to_id:
+                self.add(token)
+        return array("I", map(token_to_id.__getitem__, tokens))
+
+    def decode(self, token_ids: Iterable[int]) -> list[str]:
+        """Returns the tokens of the given IDs."""
+        return list(map(self.id_to_token.__getitem__, token_ids))
+
+
+# Tests for Vocabulary
+_vocabulary = Vocabulary(["b"])
+assert list(_vocabulary.encode(["a", "b", "a", "c"])) == [1, 0, 1, 2]
+assert _vocabulary.decode([2, 1, 0]) == ["c", "a", "b"]
+assert len(_vocabulary) == 3 and "c" in _vocabulary and "d" not in _vocabulary
+assert _vocabulary.add("d") == 3 and _vocabulary.add("a") == 1
+assert list(_vocabulary.encode([])) == []
@@ -0,0 +1,244 @@
+import io
+import mmap
+import re
+import tempfile
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# --- Reading ---
+
+# A label followed by `<index>:<value>` pairs, each with exactly one colon, or
+# a blank line
+_LIBSVM_LINE_PATTERN = re.compile(rb"\s*(?:[^\s:]+(?:\s+[^\s:]+:[^\s:]+)*)?\s*")
+
+# Typecodes of `array` with the same item type as their NumPy dtype
+_ARRAY_TYPECODES = set("bBhHiIlLqQfd")
+
+
+def _iter_lines(source: str | Path | BinaryIO | mmap.mmap) -> Iterator[bytes]:
+    """Yields the lines of a path, a binary file object or an mmap, one at a time."""
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            yield from f
+    elif isinstance(source, mmap.mmap):
+        # Iterating over an mmap yields single bytes, so read it line by line.
+        yield from iter(source.readline, b"")
+    else:
+        yield from source
+
+
+def read_libsvm(
+    source: str | Path | BinaryIO | mmap.mmap,
+    n_features: int | None = None,
+    dtype: type = np.int32,
+) -> tuple[csr_matrix, np.ndarray]:
+    """
+    Reads a LIBSVM file (e.g. `labeledBow.feat`) into a sparse CSR matrix.
+
+    Each line has the format `<label> <index>:<value> <index>:<value> ...`.
+    Indices are used as they are written (the IMDB `.feat` files are 0-based).
+
+    The file is parsed line by line, and the non-zeros are appended to compact
+    `array` buffers of the target type, so memory scales with the number of
+    non-zeros instead of documents x vocabulary, and the whole file is never
+    held as one string.
+
+    Args:
+        source: A path, a file opened in binary mode, or an `mmap` of the file.
+        n_features: Number of columns of the matrix. Defaults to the largest
+            index found + 1.
+        dtype: Type of the values. Integer types parse values with `int`,
+            other types with `float`.
+
+    Returns:
+        A tuple containing:
+            - The `(n_documents, n_features)` CSR matrix, with int32 indices.
+            - The labels, as a float64 array.
+
+    Raises:
+        ValueError: If a line is malformed (with its line number), or if an
+            index is negative or not smaller than `n_features`.
+    """
+    parse_value = int if np.issubdtype(dtype, np.integer) else float
+    typecode = np.dtype(dtype).char
+    if typecode not in _ARRAY_TYPECODES:
+        # E.g. float16, buffered as the widest type of its kind then cast
+        typecode = "q" if parse_value is int else "d"
+    values = array(typecode)
+    labels = array("d")
+    indices = array("i")
+    indptr = array("q", [0])
+
+    for line_number, line in enumerate(_iter_lines(source), 1):
+        if not _LIBSVM_LINE_PATTERN.fullmatch(line):
+            raise ValueError(
+                f"line {line_number}: expected `<label> <index>:<value> ...`, "
+                f"got {line.strip()[:80]!r}."
+            )
+        parts = line.replace(b":", b" ").split()
+        if not parts:
+            continue
+        try:
+            label = float(parts[0])
+            indices.extend(map(int, parts[1::2]))
+            values.extend(map(parse_value, parts[2::2]))
+        except (ValueError, OverflowError) as error:
+            raise ValueError(f"line {line_number}: {error}") from error
+        labels.append(label)
+        indptr.append(len(indices))
+
+    indices_array = np.frombuffer(indices, dtype=np.int32)
+    if len(indices_array) and indices_array.min() < 0:
+        raise ValueError("LIBSVM feature indices must be non-negative.")
+    max_index = int(indices_array.max()) if len(indices_array) else -1
+    if n_features is None:
+        n_features = max_index + 1
+    elif max_index >= n_features:
+        raise ValueError(
+            f"Found feature index {max_index}, but n_features is {n_features}."
+        )
+
+    X = csr_matrix(
+        (
+            np.frombuffer(values, dtype=values.typecode).astype(dtype, copy=False),
+            indices_array,
+            np.frombuffer(indptr, dtype=np.int64),
+        ),
+        shape=(len(labels), n_features),
+    )
+    return X, np.frombuffer(labels, dtype=np.float64).copy()
+
+
+# Same example as the dense parser of the exercise 1 notebook
+X_example, y_example = read_libsvm(io.BytesIO(b"1 0:9 1:1 3:87\n-1 2:1 3:2"))
+assert np.all(X_example.toarray() == [[9, 1, 0, 87], [0, 0, 1, 2]])
+assert np.all(y_example == [1, -1])
+assert X_example.dtype == np.int32 and X_example.indices.dtype == np.int32
+
+X_example, y_example = read_libsvm(
+    io.BytesIO(b"7 1:0.5\n\n3\n"), n_features=3, dtype=np.float32
+)
+assert np.allclose(X_example.toarray(), [[0, 0.5, 0], [0, 0, 0]])
+assert X_example.dtype == np.float32 and np.all(y_example == [7, 3])
+
+for _content in [b"1 5:1", b"1 0:1\n\n1 2", b"1 0:1:2", b"1 0:x", b"x 0:1"]:
+    try:
+        read_libsvm(io.BytesIO(_content), n_features=3)
+        assert False, f"ValueError not raised for {_content!r}"
+    except ValueError as _error:
+        # Malformed lines are reported with their line number
+        assert _content == b"1 5:1" or str(_error).startswith(
+            "line 3:" if b"\n" in _content else "line 1:"
+        )
+
+
+# --- Writing ---
+
+
+def _format_number(value: float) -> str:
+    """Formats integral values without a decimal part, like the IMDB files."""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def write_libsvm(
+    file: str | Path | BinaryIO, X: csr_matrix, y: Sequence[float]
+) -> None:
+    """
+    Writes a sparse matrix and its labels in the LIBSVM format read by
+    `read_libsvm`, one line per row, with the indices of each row sorted.
+
+    Args:
+        file: A path, or a file opened in binary mode.
+        X: The matrix to write. Converted to CSR if needed.
+        y: One label per row of `X`.
+    """
+    X = csr_matrix(X)
+    if X.shape[0] != len(y):
+        raise ValueError("X and y must have the same number of rows.")
+    if not X.has_sorted_indices:
+        X = X.sorted_indices()
+
+    if isinstance(file, (str, Path)):
+        with open(file, "wb") as f:
+            write_libsvm(f, X, y)
+        return
+
+    values_are_integers = np.issubdtype(X.dtype, np.integer)
+    for row, label in enumerate(y):
+        start, end = X.indptr[row], X.indptr[row + 1]
+        row_values = X.data[start:end].tolist()
+        if not values_are_integers:
+            row_values = map(_format_number, row_values)
+        features = " ".join(
+            f"{index}:{value}"
+            for index, value in zip(X.indices[start:end].tolist(), row_values)
+        )
+        line = (
+            f"{_format_number(label)} {features}" if features else _format_number(label)
+        )
+        file.write(line.encode() + b"\n")
+
+
+def bag_of_words_matrix(
+    documents_ids: Iterable[Sequence[int]], n_features: int, dtype: type = np.int32
+) -> csr_matrix:
+    """
+    Builds the sparse bag-of-words matrix of documents given as token IDs
+    (e.g. the `array('I')` returned by `full_preprocess_document` with a
+    `Vocabulary`), to be written with `write_libsvm`.
+
+    Args:
+        documents_ids: The token IDs of each document.
+        n_features: Number of columns, usually the vocabulary size.
+        dtype: Type of the counts.
+
+    Returns:
+        A `(n_documents, n_features)` CSR matrix of token counts.
+    """
+    indices: list[np.ndarray] = []
+    counts: list[np.ndarray] = []
+    indptr = [0]
+    for token_ids in documents_ids:
+        doc_indices, doc_counts = np.unique(
+            np.asarray(token_ids, dtype=np.int32), return_counts=True
+        )
+        indices.append(doc_indices)
+        counts.append(doc_counts)
+        indptr.append(indptr[-1] + len(doc_indices))
+
+    return csr_matrix(
+        (
+            np.concatenate(counts).astype(dtype) if counts else np.zeros(0, dtype),
+            np.concatenate(indices) if indices else np.zeros(0, np.int32),
+            np.array(indptr, dtype=np.int64),
+        ),
+        shape=(len(indptr) - 1, n_features),
+    )
+
+
+X_example = bag_of_words_matrix([array("I", [3, 0, 3]), array("I"), [1]], n_features=4)
+assert np.all(X_example.toarray() == [[1, 0, 0, 2], [0, 0, 0, 0], [0, 1, 0, 0]])
+
+# Round trip through a file, read back with mmap
+with tempfile.TemporaryDirectory() as _tmp_dir:
+    _path = Path(_tmp_dir) / "bow.feat"
+    write_libsvm(_path, X_example, [10, 1, 7])
+    assert _path.read_bytes() == b"10 0:1 3:2\n1\n7 1:1\n"
+    with (
+        open(_path, "rb") as _f,
+        mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ) as _mm,
+    ):
+        X_read, y_read = read_libsvm(_mm, n_features=4)
+    assert np.all(X_read.toarray() == X_example.toarray())
+    assert np.all(y_read == [10, 1, 7])
+
+_buffer = io.BytesIO()
+write_libsvm(_buffer, csr_matrix(np.array([[0.0, 0.25]])), [-1.0])
+assert _buffer.getvalue() == b"-1 1:0.25\n"
@@ -0,0 +1,270 @@
+import time
+from collections import defaultdict
+from typing import Iterable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.sparse import csr_matrix
+
+START_TOKEN = "<START>"
+END_TOKEN = "<END>"
+
+
+class MarkovModel:
+    """
+    N-gram Markov chain over the tokens of a corpus, e.g. the tokens of
+    `preprocess_for_markov` in the training notebook:
+
+        model = MarkovModel(corpus_for_markov, order=2)
+        for tokens in model.generate(5, seed=0):
+            print(" ".join(tokens))
+
+    A state is a context of `order` token IDs (padded with `START_TOKEN` at the
+    beginning of a document), and the transitions are a CSR matrix of
+    `n_states x n_tokens` probabilities, built with NumPy from the counts of
+    every (context, next token) pair, instead of one dict per state.
+
+    Sampling a next token draws an integer below the count of its state, and
+    finds it in the cumulative counts of the row with a binary search, i.e.
+    O(log k) without any allocation per token, and `generate` advances all the
+    chains in lockstep, one vectorized step per token.
+
+    Attributes:
+        order: Number of tokens of a context.
+        vocabulary: The token of each token ID (`START_TOKEN` is 0, and
+            `END_TOKEN` is 1).
+        contexts: The token IDs of the context of each state, as an
+            `(n_states, order)` array.
+        transitions: The probability of each next token ID of each state.
+    """
+
+    def __init__(self, token_lists: Iterable[list[str]], order: int = 1):
+        """
+        Args:
+            token_lists: The tokens of each document. Empty documents are
+                ignored, and the tokens cannot be `START_TOKEN` or
+                `END_TOKEN`.
+            order: Number of previous tokens the next token depends on (1 for
+                bigrams, 2 for trigrams...).
+
+        Raises:
+            ValueError: If `order` is not positive, if every document is
+                empty, or if a document contains `START_TOKEN` or `END_TOKEN`.
+        """
+        if order < 1:
+            raise ValueError(f"The order must be positive, got {order}.")
+        self.order = order
+        token_to_id = {START_TOKEN: 0, END_TOKEN: 1}
+        padding = [0] * order
+
+        # Every document, padded with `order` START and one END
+        sequence = []
+        n_documents = 0
+        for tokens in token_lists:
+            if tokens:
+                n_documents += 1
+                sequence += padding
+                sequence += [
+                    token_to_id.setdefault(t, len(token_to_id)) for t in tokens
+                ]
+                sequence.append(1)
+        if not sequence:
+            raise ValueError("Cannot build a Markov model from an empty corpus.")
+        self.vocabulary = list(token_to_id)
+        n_tokens = len(self.vocabulary)
+
+        # The token predicted at each position after the padding, and its context
+        sequence = np.array(sequence, dtype=np.int64)
+        # Documents containing START or END would be cut or misaligned
+        if np.count_nonzero(sequence <= 1) != (order + 1) * n_documents:
+            raise ValueError(
+                f"Documents cannot contain {START_TOKEN!r} or {END_TOKEN!r}."
+            )
+        is_padding = np.zeros(len(sequence), dtype=bool)
+        document_starts = np.flatnonzero(sequence[:-1] == 1) + 1
+        for shift in range(order):
+            is_padding[shift] = True
+            is_padding[document_starts + shift] = True
+        positions = np.flatnonzero(~is_padding)
+        next_tokens = sequence[positions]
+        windows = sliding_window_view(sequence, order)[positions - order]
+        self.contexts, states = np.unique(windows, axis=0, return_inverse=True)
+        states = states.reshape(-1)
+        self._start_state = int(states[0])
+
+        # Counts of the (state, next token) pairs, sorted by state then token
+        pairs, pair_of_position, counts = np.unique(
+            states * n_tokens + next_tokens, return_inverse=True, return_counts=True
+        )
+        pair_of_position = pair_of_position.reshape(-1)
+        pair_states, pair_tokens = np.divmod(pairs, n_tokens)
+        indptr = np.searchsorted(pair_states, np.arange(len(self.contexts) + 1))
+        cumulative_counts = np.cumsum(counts)
+        state_bounds = np.concatenate([[0], cumulative_counts])[indptr]
+        state_counts = np.diff(state_bounds)
+        self.transitions = csr_matrix(
+            (counts / np.repeat(state_counts, np.diff(indptr)), pair_tokens, indptr),
+            shape=(len(self.contexts), n_tokens),
+        )
+
+        # The state reached after each pair (the context of the next position
+        # of the same document), or -1 after END
+        self._next_states = np.full(len(pairs), -1, dtype=np.int64)
+        not_end = np.flatnonzero(next_tokens != 1)
+        self._next_states[pair_of_position[not_end]] = states[not_end + 1]
+
+        self._tokens = pair_tokens
+        self._cumulative_counts = cumulative_counts
+        self._state_offsets = state_bounds[:-1]
+        self._state_counts = state_counts
+
+    def generate_ids(
+        self,
+        n_sentences: int,
+        max_length: int = 100,
+        rng: np.random.Generator | None = None,
+    ) -> np.ndarray:
+        """
+        Same as `generate`, with token IDs.
+
+        Returns:
+            A `(n_sentences, max_length)` array of token IDs, in which each
+            sentence is followed by `END_TOKEN` (1) if it ended before
+            `max_length` tokens.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        sentences = np.ones((n_sentences, max_length), dtype=np.int64)
+        chains = np.arange(n_sentences)
+        states = np.full(n_sentences, self._start_state, dtype=np.int64)
+        for step in range(max_length):
+            draws = rng.integers(self._state_counts[states])
+            pairs = np.searchsorted(
+                self._cumulative_counts, self._state_offsets[states] + draws, "right"
+            )
+            sentences[chains, step] = self._tokens[pairs]
+            running = self._tokens[pairs] != 1
+            chains, states = chains[running], self._next_states[pairs[running]]
+            if len(chains) == 0:
+                break
+        return sentences
+
+    def generate(
+        self, n_sentences: int, max_length: int = 100, seed: int | None = None
+    ) -> list[list[str]]:
+        """
+        Generates sentences from the beginning of a document, advancing all the
+        chains together.
+
+        Args:
+            n_sentences: Number of sentences.
+            max_length: Maximum number of tokens of a sentence.
+            seed: Seed of the random generator, the same seed giving the same
+                sentences.
+
+        Returns:
+            The tokens of each sentence, without `START_TOKEN` and `END_TOKEN`.
+        """
+        sentences = self.generate_ids(
+            n_sentences, max_length, np.random.default_rng(seed)
+        )
+        lengths = np.argmax(
+            np.concatenate([sentences, np.ones((n_sentences, 1), np.int64)], 1) == 1, 1
+        )
+        vocabulary = np.array(self.vocabulary, dtype=object)
+        return [
+            vocabulary[sentence[:length]].tolist()
+            for sentence, length in zip(sentences, lengths)
+        ]
+
+
+# Tests for MarkovModel
+_documents = [["a", "b", "c"], ["a", "c"], [], ["b", "b", "a", "c"]]
+_model = MarkovModel(_documents)
+assert _model.vocabulary == [START_TOKEN, END_TOKEN, "a", "b", "c"]
+
+# Same probabilities as the dict of counts of the training notebook
+_counts = defaultdict(lambda: defaultdict(int))
+for _tokens in _documents:
+    if _tokens:
+        _tagged = [START_TOKEN] + _tokens + [END_TOKEN]
+        for _token, _next in zip(_tagged, _tagged[1:]):
+            _counts[_token][_next] += 1
+_probabilities = _model.transitions.toarray()
+for _state, (_context,) in enumerate(_model.contexts):
+    _row = _counts[_model.vocabulary[_context]]
+    for _next, _probability in enumerate(_probabilities[_state]):
+        assert np.isclose(
+            _probability, _row[_model.vocabulary[_next]] / sum(_row.values())
+        )
+
+# Deterministic chains generate their document, and stop at max_length
+assert (
+    MarkovModel([["x", "y", "x", "z"]], order=2).generate(3)
+    == [["x", "y", "x", "z"]] * 3
+)
+assert (
+    MarkovModel([["x", "y", "x", "z"]], order=2).generate(2, max_length=2)
+    == [["x", "y"]] * 2
+)
+assert MarkovModel([["x"] * 5]).generate(1, max_length=0) == [[]]
+
+# Generated trigrams were all seen in the corpus
+_model = MarkovModel(_documents, order=2)
+_trigrams = {
+    tuple(_tagged[i : i + 3])
+    for _tokens in _documents
+    if _tokens
+    for _tagged in [[START_TOKEN] * 2 + _tokens + [END_TOKEN]]
+    for i in range(len(_tagged) - 2)
+}
+_sentences = _model.generate(200, seed=0)
+assert _sentences == _model.generate(200, seed=0)
+for _sentence in _sentences:
+    _tagged = [START_TOKEN] * 2 + _sentence + [END_TOKEN]
+    assert all(tuple(_tagged[i : i + 3]) in _trigrams for i in range(len(_tagged) - 2))
+
+# The first tokens follow the probabilities of the start state
+_first_tokens = MarkovModel(_documents).generate_ids(
+    30_000, 1, np.random.default_rng(0)
+)
+_frequencies = np.bincount(_first_tokens[:, 0], minlength=5) / 30_000
+assert np.allclose(_frequencies, [0, 0, 2 / 3, 1 / 3, 0], atol=0.02)
+
+for _bad_arguments in [
+    ([["a"]], 0),
+    ([[], []], 1),
+    ([["a", END_TOKEN, "b"]], 1),
+    ([["a"], [START_TOKEN]], 2),
+]:
+    try:
+        MarkovModel(*_bad_arguments)
+        assert False, "ValueError not raised"
+    except ValueError:
+        pass  # Expected
+
+
+if __name__ == "__main__":
+    # Generation throughput on a synthetic corpus
+    _rng = np.random.default_rng(0)
+    _words = [f"w{i}" for i in range(5_000)]
+    _zipf = 1 / np.arange(1, len(_words) + 1)
+    _corpus = [
+        [
+            _words[i]
+            for i in _rng.choice(
+                len(_words), _rng.integers(5, 200), p=_zipf / _zipf.sum()
+            )
+        ]
+        for _ in range(2_000)
+    ]
+    for _order in [1, 2]:
+        _start = time.perf_counter()
+        _model = MarkovModel(_corpus, order=_order)
+        _built = time.perf_counter() - _start
+        _start = time.perf_counter()
+        _n_tokens = sum(map(len, _model.generate(10_000, seed=0)))
+        _seconds = time.perf_counter() - _start
+        print(
+            f"order {_order}: {len(_model.contexts)} states, built in {_built:.2f} s, "
+            f"{_n_tokens / _seconds:,.0f} generated tokens/s"
+        )
@@ -0,0 +1,241 @@
+import itertools
+import zlib
+from typing import Iterable, Iterator, Mapping, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Maximum number of tokens whose column is cached by a hashing vectorizer
+MAX_CACHED_TOKENS = 2**20
+
+
+class _HashedColumns(dict):
+    """
+    Cache of the signed column of each token: `column` for a +1 sign, and
+    `~column` (i.e. -column - 1) for a -1 sign. Cleared when it gets larger
+    than `MAX_CACHED_TOKENS`, so that its memory stays bounded.
+    """
+
+    def __init__(self, n_features_log2: int, signed: bool):
+        super().__init__()
+        self.mask = (1 << n_features_log2) - 1
+        self.signed = signed
+
+    def __missing__(self, token: str) -> int:
+        hash_value = zlib.crc32(token.encode("utf-8"))
+        # The low bits give the column and the high bit the sign
+        column = hash_value & self.mask
+        if self.signed and hash_value >> 31:
+            column = ~column
+        if len(self) >= MAX_CACHED_TOKENS:
+            self.clear()
+        self[token] = column
+        return column
+
+
+class StreamingVectorizer:
+    """
+    Bag-of-words (or TF-IDF) vectorizer that turns token lists, e.g. from
+    `full_preprocess_document` or `preprocess_corpus`, into blocks of rows of
+    a `scipy.sparse` CSR matrix, without building a dense matrix or keeping
+    the corpus in memory.
+
+    The columns are either given by a fixed vocabulary (tokens out of it are
+    ignored), or by the hashing trick: a token goes to the column given by the
+    low bits of its CRC32, and with `signed=True` its count is added with the
+    sign given by the high bit, so that collisions cancel out on average
+    instead of piling up. Hashing needs no vocabulary at all, so the first
+    rows are emitted before the rest of the corpus has been read.
+
+    For TF-IDF, the document frequencies are counted in a first pass with
+    `fit_idf`, in memory proportional to the number of columns only.
+
+    Example, training an incremental classifier on blocks of 1000 reviews:
+
+        vectorizer = StreamingVectorizer(n_features_log2=18)
+        documents = (full_preprocess_document(text) for text in texts)
+        label_blocks = itertools.batched(labels, 1000)
+        for X, y in zip(vectorizer.transform_blocks(documents, 1000), label_blocks):
+            classifier.partial_fit(X, y, classes=[0, 1])
+
+    Attributes:
+        n_features: Number of columns.
+        idf: The inverse document frequency of each column, once fitted.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Mapping[str, int] | Sequence[str] | None = None,
+        n_features_log2: int = 20,
+        signed: bool = True,
+        dtype: type = np.float32,
+    ):
+        """
+        Args:
+            vocabulary: The column of each token (e.g. `Vocabulary.token_to_id`),
+                or the tokens in column order. If None, tokens are hashed.
+            n_features_log2: Log2 of the number of columns when hashing,
+                between 1 and 31.
+            signed: Whether hashed counts get a sign.
+            dtype: Type of the values of the matrices.
+
+        Raises:
+            ValueError: If `n_features_log2` is out of range.
+        """
+        if vocabulary is not None:
+            if not isinstance(vocabulary, Mapping):
+                vocabulary = {token: column for column, token in enumerate(vocabulary)}
+            self._columns = dict(vocabulary)
+            self.n_features = max(self._columns.values(), default=-1) + 1
+            self._hashing = False
+        else:
+            if not 1 <= n_features_log2 <= 31:
+                raise ValueError(
+                    f"n_features_log2 must be between 1 and 31, got {n_features_log2}."
+                )
+            self._columns = _HashedColumns(n_features_log2, signed)
+            self.n_features = 1 << n_features_log2
+            self._hashing = True
+        self.dtype = dtype
+        self.idf: np.ndarray | None = None
+
+    def _signed_columns(self, tokens: list[str]) -> list[int]:
+        if self._hashing:
+            return list(map(self._columns.__getitem__, tokens))
+        columns = self._columns
+        return [
+            column for token in tokens if (column := columns.get(token)) is not None
+        ]
+
+    def _counts(self, token_lists: Iterable[list[str]]) -> csr_matrix:
+        """The (signed) counts matrix of some documents."""
+        signed_columns = []
+        indptr = [0]
+        for tokens in token_lists:
+            signed_columns += self._signed_columns(tokens)
+            indptr.append(len(signed_columns))
+        signed_columns = np.array(signed_columns, dtype=np.int64)
+        negative = signed_columns < 0
+        counts = csr_matrix(
+            (
+                np.where(negative, -1, 1).astype(self.dtype),
+                np.where(negative, ~signed_columns, signed_columns).astype(np.int32),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+        counts.sum_duplicates()
+        if self._hashing:
+            counts.eliminate_zeros()  # Collisions with opposite signs
+        return counts
+
+    def fit_idf(
+        self, token_lists: Iterable[list[str]], block_size: int = 1000
+    ) -> "StreamingVectorizer":
+        """
+        Counts the document frequency of each column, and sets the smoothed
+        inverse document frequencies `log((1 + n) / (1 + df)) + 1` used by
+        the next calls to `transform`.
+
+        Args:
+            token_lists: The tokens of each document, consumed lazily.
+            block_size: Number of documents counted at once.
+
+        Returns:
+            The vectorizer itself.
+
+        Raises:
+            ValueError: If the values of the matrices are integers.
+        """
+        if not np.issubdtype(self.dtype, np.floating):
+            raise ValueError("TF-IDF values need a floating point dtype.")
+        document_frequencies = np.zeros(self.n_features, dtype=np.int64)
+        n_documents = 0
+        for block in itertools.batched(token_lists, block_size):
+            counts = self._counts(block)
+            document_frequencies += np.bincount(
+                counts.indices, minlength=self.n_features
+            )
+            n_documents += len(block)
+        self.idf = (np.log((1 + n_documents) / (1 + document_frequencies)) + 1).astype(
+            self.dtype
+        )
+        return self
+
+    def transform(self, token_lists: Iterable[list[str]]) -> csr_matrix:
+        """
+        Returns the rows of some documents: their token counts, or once
+        `fit_idf` was called, their L2-normalized TF-IDF.
+        """
+        rows = self._counts(token_lists)
+        if self.idf is not None:
+            rows.data *= self.idf[rows.indices]
+            row_of_values = np.repeat(np.arange(rows.shape[0]), np.diff(rows.indptr))
+            norms = np.sqrt(
+                np.bincount(row_of_values, rows.data**2, minlength=rows.shape[0])
+            )
+            rows.data /= norms[row_of_values].astype(self.dtype)
+        return rows
+
+    def transform_blocks(
+        self, token_lists: Iterable[list[str]], block_size: int = 1000
+    ) -> Iterator[csr_matrix]:
+        """
+        Same as `transform`, for a stream of documents: yields the rows of
+        every `block_size` documents, as soon as they are read.
+        """
+        for block in itertools.batched(token_lists, block_size):
+            yield self.transform(block)
+
+
+# Tests for StreamingVectorizer
+_documents = [["good", "movie", "good"], [], ["bad", "unknown", "movie"]]
+_vectorizer = StreamingVectorizer(["bad", "good", "movie"], dtype=np.int32)
+assert np.all(
+    _vectorizer.transform(_documents).toarray() == [[0, 2, 1], [0, 0, 0], [1, 0, 1]]
+)
+assert _vectorizer.transform(_documents).dtype == np.int32
+_blocks = list(_vectorizer.transform_blocks(iter(_documents), block_size=2))
+assert [_block.shape for _block in _blocks] == [(2, 3), (1, 3)]
+assert np.all(_blocks[1].toarray() == [[1, 0, 1]])
+
+# Same TF-IDF as scikit-learn's TfidfVectorizer (smooth_idf, norm="l2")
+_vectorizer = StreamingVectorizer({"bad": 0, "good": 1, "movie": 2}, dtype=np.float64)
+_vectorizer.fit_idf(iter(_documents), block_size=2)
+assert np.allclose(_vectorizer.idf, np.log(4 / np.array([2, 2, 3])) + 1)
+_tf_idf = np.array([[0, 2, 1], [0, 0, 0], [1, 0, 1]]) * _vectorizer.idf
+_norms = np.linalg.norm(_tf_idf, axis=1, keepdims=True)
+assert np.allclose(
+    _vectorizer.transform(_documents).toarray(),
+    np.divide(_tf_idf, _norms, out=np.zeros_like(_tf_idf), where=_norms > 0),
+)
+
+# Hashing: the same token always gets the same column and sign
+_vectorizer = StreamingVectorizer(n_features_log2=4)
+_rows = _vectorizer.transform([["good"], ["good", "good"], ["good", "movie"]])
+assert _rows.shape == (3, 16) and _rows[1].nnz == 1
+assert _rows[1].indices[0] == _rows[0].indices[0] == zlib.crc32(b"good") & 15
+assert np.allclose(_rows[1].data, 2 * _rows[0].data) and abs(_rows[0].data[0]) == 1
+_rows = StreamingVectorizer(n_features_log2=4, signed=False).transform(_documents)
+assert np.all(_rows.data > 0) and _rows.sum() == 6
+
+# Two tokens in the same column with opposite signs cancel out
+_columns = _HashedColumns(n_features_log2=2, signed=True)
+_by_signed_column = {}
+for _token in map(str, itertools.count()):
+    _by_signed_column.setdefault(_columns[_token], _token)
+    if ~_columns[_token] in _by_signed_column:
+        break
+_pair = [_token, _by_signed_column[~_columns[_token]]]
+_rows = StreamingVectorizer(n_features_log2=2).transform([_pair, _pair[:1]])
+assert _rows[0].nnz == 0 and _rows[1].nnz == 1
+
+for _make_invalid in [
+    lambda: StreamingVectorizer(n_features_log2=32),
+    lambda: StreamingVectorizer(dtype=np.int32).fit_idf(_documents),
+]:
+    try:
+        _make_invalid()
+        assert False, "ValueError not raised"
+    except ValueError:
+        pass  # Expected
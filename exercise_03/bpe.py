@@ -0,0 +1,379 @@
+import collections
+import heapq
+import itertools
+import math
+import operator
+import random
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+
+UNK_TOKEN = "[UNK]"
+
+
+def _split_word(word: str, base_vocab: set[str], unk_token: str) -> list[str]:
+    """Splits a word into its characters, replacing unknown ones by `unk_token`."""
+    return [char if char in base_vocab else unk_token for char in word]
+
+
+def _pair_counts(symbols: list[str], unk_token: str) -> collections.Counter:
+    """Counts the adjacent pairs of symbols of a word, skipping the unknown ones."""
+    return collections.Counter(
+        pair for pair in zip(symbols, symbols[1:]) if unk_token not in pair
+    )
+
+
+def _merge_pair(
+    symbols: list[str], a: str, b: str, merged_token: str | None = None
+) -> list[str]:
+    """
+    Merges the occurrences of the pair (a, b) in a word, from left to right,
+    into `merged_token` (`a + b` by default).
+    """
+    if merged_token is None:
+        merged_token = a + b
+    merged: list[str] = []
+    i = 0
+    while i < len(symbols):
+        if i < len(symbols) - 1 and symbols[i] == a and symbols[i + 1] == b:
+            merged.append(merged_token)
+            i += 2
+        else:
+            merged.append(symbols[i])
+            i += 1
+    return merged
+
+
+assert _merge_pair(["t", "h", "e", "t", "h"], "t", "h") == ["th", "e", "th"]
+assert _merge_pair(["a", "a", "a"], "a", "a") == ["aa", "a"]
+assert _merge_pair(["a"], "a", "b") == ["a"]
+assert _merge_pair(["a", "b", "c"], "a", "b", "x") == ["x", "c"]
+
+
+def _naive_merges(
+    words: dict[str, list[str]],
+    word_freqs: dict[str, int],
+    unk_token: str,
+    pair_key: Callable[
+        [tuple[str, str], collections.Counter, collections.Counter], tuple
+    ],
+    merged_token: Callable[[str, str], str] = operator.add,
+) -> Iterator[tuple[str, str]]:
+    """
+    Reference training loop, also used by `wordpiece._train_naive`: before each
+    merge, all the pairs and symbols of the corpus are recounted, and the pair
+    with the smallest `pair_key(pair, pair_counts, symbol_counts)` is merged
+    into `merged_token(a, b)`. Stops when no pair is left.
+
+    Args:
+        words: The initial symbols of every word of `word_freqs`.
+    """
+    while True:
+        pair_counts: collections.Counter = collections.Counter()
+        symbol_counts: collections.Counter = collections.Counter()
+        for word, symbols in words.items():
+            for pair, count in _pair_counts(symbols, unk_token).items():
+                pair_counts[pair] += count * word_freqs[word]
+            for symbol in symbols:
+                symbol_counts[symbol] += word_freqs[word]
+        if not pair_counts:
+            return
+        a, b = min(
+            pair_counts, key=lambda pair: pair_key(pair, pair_counts, symbol_counts)
+        )
+        yield a, b
+        merged = merged_token(a, b)
+        words = {
+            word: _merge_pair(symbols, a, b, merged) for word, symbols in words.items()
+        }
+
+
+def _train_naive(
+    word_freqs: dict[str, int], base_vocab: set[str], num_merges: int, unk_token: str
+) -> list[tuple[str, str]]:
+    """
+    Reference BPE training, as in the notebook: every merge recounts all the
+    pairs of the corpus. Only used to check `BPETokenizer.train`.
+    """
+    words = {word: _split_word(word, base_vocab, unk_token) for word in word_freqs}
+    # Most frequent pair, ties broken by the smallest pair
+    merges = _naive_merges(
+        words,
+        word_freqs,
+        unk_token,
+        lambda pair, pair_counts, symbol_counts: (-pair_counts[pair], pair),
+    )
+    return list(itertools.islice(merges, num_merges))
+
+
+class BPETokenizer:
+    """
+    Byte-Pair Encoding tokenizer working on the characters of each word.
+
+    Args:
+        base_vocab: The initial symbols (e.g. the characters of the corpus, or
+                    the printable ASCII characters). Characters of the training
+                    words that are not in it become `unk_token` and are never
+                    merged.
+        num_merges: Number of merges to learn.
+        unk_token: Symbol used for unknown characters.
+        max_cache_size: Maximum number of words whose encoding is cached. When
+            full, the least recently used word is evicted. If None, the cache
+            is unbounded.
+
+    Attributes:
+        merges: The learned merges, in the order they were learned.
+        vocab: Mapping from every token (base symbols, then merged tokens) to
+               its ID.
+        cache_hits: Number of words encoded from the cache.
+        cache_misses: Number of words that had to be merged.
+    """
+
+    def __init__(
+        self,
+        base_vocab: Iterable[str],
+        num_merges: int = 1000,
+        unk_token: str = UNK_TOKEN,
+        max_cache_size: int | None = 100_000,
+    ):
+        if max_cache_size is not None and max_cache_size < 1:
+            raise ValueError("max_cache_size must be at least 1, or None.")
+        self.base_vocab = sorted(set(base_vocab))
+        self.num_merges = num_merges
+        self.unk_token = unk_token
+        self.max_cache_size = max_cache_size
+        self.merges: list[tuple[str, str]] = []
+        self.vocab: dict[str, int] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._build_tables()
+
+    def train(self, texts: Iterable[list[str]]) -> None:
+        """
+        Learns `num_merges` merges from a tokenized corpus (e.g. the output of
+        `preprocessing.preprocess`).
+
+        Each distinct word is split into symbols once, with its frequency.
+        The pair counts are computed once, then kept up to date: a merge only
+        recounts the words that contain the merged pair, found through a
+        pair -> words index. The most frequent pair is taken from a max-heap
+        whose outdated entries are skipped when popped. The merges are the
+        ones the naive algorithm (recount everything after each merge) learns,
+        with ties broken by the smallest pair.
+
+        Args:
+            texts: A list of documents, each a list of words.
+        """
+        base_vocab = set(self.base_vocab)
+        unk_token = self.unk_token
+
+        word_freqs: collections.Counter[str] = collections.Counter()
+        for words in texts:
+            word_freqs.update(words)
+
+        words_symbols = [
+            _split_word(word, base_vocab, unk_token) for word in word_freqs
+        ]
+        freqs = list(word_freqs.values())
+
+        pair_counts: collections.Counter = collections.Counter()
+        pair_to_words: dict[tuple[str, str], set[int]] = collections.defaultdict(set)
+        for word_index, symbols in enumerate(words_symbols):
+            for pair, count in _pair_counts(symbols, unk_token).items():
+                pair_counts[pair] += count * freqs[word_index]
+                pair_to_words[pair].add(word_index)
+
+        heap = [(-count, pair) for pair, count in pair_counts.items()]
+        heapq.heapify(heap)
+
+        merges: list[tuple[str, str]] = []
+        while heap and len(merges) < self.num_merges:
+            negative_count, pair = heapq.heappop(heap)
+            if pair_counts.get(pair, 0) != -negative_count or negative_count == 0:
+                continue  # Outdated entry
+            a, b = pair
+            merges.append(pair)
+
+            changed_pairs: set[tuple[str, str]] = set()
+            for word_index in sorted(pair_to_words.pop(pair)):
+                symbols = words_symbols[word_index]
+                freq = freqs[word_index]
+                old_pairs = _pair_counts(symbols, unk_token)
+                symbols = _merge_pair(symbols, a, b)
+                new_pairs = _pair_counts(symbols, unk_token)
+                words_symbols[word_index] = symbols
+
+                for old_pair, count in old_pairs.items():
+                    pair_counts[old_pair] -= count * freq
+                    if old_pair not in new_pairs and old_pair != pair:
+                        pair_to_words[old_pair].discard(word_index)
+                for new_pair, count in new_pairs.items():
+                    pair_counts[new_pair] += count * freq
+                    pair_to_words[new_pair].add(word_index)
+                changed_pairs.update(old_pairs)
+                changed_pairs.update(new_pairs)
+
+            del pair_counts[pair]
+            changed_pairs.discard(pair)
+            for changed_pair in changed_pairs:
+                count = pair_counts[changed_pair]
+                if count > 0:
+                    heapq.heappush(heap, (-count, changed_pair))
+                else:
+                    del pair_counts[changed_pair]
+
+        self.merges = merges
+        self._build_tables()
+
+    def _build_tables(self) -> None:
+        """Builds the vocabulary, the merge ranks, and empties the cache."""
+        self.vocab = {}
+        tokens = [*self.base_vocab, self.unk_token, *(a + b for a, b in self.merges)]
+        for token in tokens:
+            self.vocab.setdefault(token, len(self.vocab))
+        self._id_to_token = list(self.vocab)
+        self._base_vocab_set = set(self.base_vocab)
+        # The first merge learned has the smallest rank
+        self._merge_ranks: dict[tuple[str, str], int] = {}
+        for rank, pair in enumerate(self.merges):
+            self._merge_ranks.setdefault(pair, rank)
+        self._cache: collections.OrderedDict[str, tuple[int, ...]] = (
+            collections.OrderedDict()
+        )
+
+    def _merge_word(self, word: str) -> tuple[int, ...]:
+        """
+        Encodes a word by repeatedly merging its pair of smallest rank, which
+        gives the same tokens as applying every learned merge in order, but
+        only looks at the pairs actually present in the word.
+        """
+        symbols = _split_word(word, self._base_vocab_set, self.unk_token)
+        ranks = self._merge_ranks
+        while len(symbols) > 1:
+            best_pair = min(
+                zip(symbols, symbols[1:]), key=lambda pair: ranks.get(pair, math.inf)
+            )
+            if best_pair not in ranks:
+                break
+            symbols = _merge_pair(symbols, *best_pair)
+        vocab = self.vocab
+        return tuple(vocab[symbol] for symbol in symbols)
+
+    def _encode_words(self, words: Iterable[str], token_ids: array) -> None:
+        """Appends the IDs of the tokens of each word to `token_ids`."""
+        cache = self._cache
+        max_cache_size = self.max_cache_size
+        hits = 0
+        misses = 0
+        for word in words:
+            word_ids = cache.get(word)
+            if word_ids is not None:
+                cache.move_to_end(word)
+                hits += 1
+            else:
+                misses += 1
+                word_ids = self._merge_word(word)
+                cache[word] = word_ids
+                if max_cache_size is not None and len(cache) > max_cache_size:
+                    cache.popitem(last=False)
+            token_ids.extend(word_ids)
+        self.cache_hits += hits
+        self.cache_misses += misses
+
+    def tokenize_word(self, word: str) -> list[str]:
+        """Splits a word into tokens."""
+        token_ids = array("I")
+        self._encode_words([word], token_ids)
+        return [self._id_to_token[token_id] for token_id in token_ids]
+
+    def tokenize(self, text: list[str]) -> list[list[str]]:
+        """Tokenizes every word of a pre-processed document."""
+        return [self.tokenize_word(word) for word in text]
+
+    def encode(self, text: list[str]) -> array:
+        """
+        Converts a pre-processed document into the IDs of its tokens.
+
+        Returns:
+            The token IDs, as an `array('I')`.
+        """
+        token_ids = array("I")
+        self._encode_words(text, token_ids)
+        return token_ids
+
+    def encode_batch(self, texts: Iterable[list[str]]) -> list[array]:
+        """
+        Encodes many pre-processed documents (e.g. the output of
+        `preprocessing.preprocess`).
+
+        Words are cached with their token IDs: IMDB words repeat heavily, so
+        once the cache is warm most words are encoded with a single lookup.
+
+        Returns:
+            One `array('I')` of token IDs per document.
+        """
+        return [self.encode(text) for text in texts]
+
+
+# Tests for BPETokenizer
+corpus1 = [
+    ["hug", "pug", "pun", "bun", "hugs"],
+    ["hug", "hug", "pun", "bun", "bun", "hugs", "hugs"],
+    ["hug", "hug", "hug", "hug", "hug", "pun", "pun", "bun", "bun"],
+]
+bpe1 = BPETokenizer(base_vocab="bghnpsu", num_merges=5)
+bpe1.train(corpus1)
+assert bpe1.merges == [("u", "g"), ("h", "ug"), ("u", "n"), ("b", "un"), ("p", "un")]
+assert bpe1.tokenize_word("hugs") == ["hug", "s"]
+assert bpe1.tokenize_word("bug") == ["b", "ug"]
+assert bpe1.tokenize_word("mug") == [UNK_TOKEN, "ug"]
+assert bpe1.tokenize(["pun", "hug"]) == [["pun"], ["hug"]]
+assert list(bpe1.vocab)[:8] == ["b", "g", "h", "n", "p", "s", "u", UNK_TOKEN]
+assert list(bpe1.vocab)[8:] == ["ug", "hug", "un", "bun", "pun"]
+assert bpe1.encode_batch([["hugs", "bun"], []]) == [
+    array("I", [9, 5, 11]),
+    array("I"),
+]
+assert bpe1.cache_hits > 0
+
+# Each word is encoded once, then read from the cache
+bpe1_small_cache = BPETokenizer(base_vocab="bghnpsu", max_cache_size=2)
+bpe1_small_cache.merges = bpe1.merges
+bpe1_small_cache._build_tables()
+assert bpe1_small_cache.encode(["hug", "hug", "pun", "bun", "hug"]) == array(
+    "I", [9, 9, 12, 11, 9]
+)
+assert (bpe1_small_cache.cache_hits, bpe1_small_cache.cache_misses) == (1, 4)
+assert list(bpe1_small_cache._cache) == ["bun", "hug"]
+
+# More merges than pairs: training stops when nothing is left to merge
+bpe2 = BPETokenizer(base_vocab="ab", num_merges=100)
+bpe2.train([["aaaa", "ab"]])
+assert bpe2.merges == _train_naive({"aaaa": 1, "ab": 1}, {"a", "b"}, 100, UNK_TOKEN)
+assert bpe2.tokenize_word("aaaa") == ["aaaa"]
+
+
+def _random_words(seed: int, n_words: int) -> list[list[str]]:
+    rng = random.Random(seed)
+    return [
+        [
+            "".join(rng.choices("abcde\xe9", k=rng.randint(1, 8)))
+            for _ in range(rng.randint(0, 10))
+        ]
+        for _ in range(n_words)
+    ]
+
+
+# Same merges as the naive algorithm, also with unknown characters
+for _seed in range(2):
+    _corpus = _random_words(_seed, 20)
+    _word_freqs = collections.Counter(word for words in _corpus for word in words)
+    _bpe = BPETokenizer(base_vocab="abcde", num_merges=40)
+    _bpe.train(_corpus)
+    assert _bpe.merges == _train_naive(_word_freqs, set("abcde"), 40, UNK_TOKEN)
+
+    # Merging by rank gives the same tokens as applying the merges in order
+    for _word in _word_freqs:
+        _symbols = _split_word(_word, set("abcde"), UNK_TOKEN)
+        for _a, _b in _bpe.merges:
+            _symbols = _merge_pair(_symbols, _a, _b)
+        assert _bpe.tokenize_word(_word) == _symbols
@@ -1,11 +1,69 @@
+import collections
+import functools
+import hashlib
+import math
+import multiprocessing
+import os
+import random
 import re
 import string
-import collections
+import sys
+import tempfile
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+
+# The modules shared by the exercises are in the `common` package, at the root
+# of the repository
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
+from common.corpus_cache import CorpusCache
+from common.profiling import StageProfiler, current_profiler, profile
+from common.review_loader import MAX_IN_FLIGHT, read_texts
+from common.vocabulary import Vocabulary
+
+# Version of this module, part of the `CorpusCache` keys: editing the
+# pre-processing code invalidates the cached tokens.
+PREPROCESSING_VERSION = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
+# Patterns and tables of the pre-processing steps, compiled once
+_HTML_ENTITIES = {
+    "&amp;": "&",
+    "&lt;": "<",
+    "&gt;": ">",
+    "&quot;": '"',
+    "&apos;": "'",
+    "&#39;": "'",
+    "&nbsp;": "\xa0",
+}
+# An HTML tag, unless it starts with "<3" (heart symbol)
+_HTML_TAG_PATTERN = re.compile(r"<(?!3)[^>]+>")
+# "&(?:amp|lt|...);", whose "&" prefix is searched faster than an alternation
+_HTML_ENTITY_PATTERN = re.compile(
+    "&(?:" + "|".join(re.escape(entity[1:-1]) for entity in _HTML_ENTITIES) + ");"
+)
+_TOKEN_PATTERN = re.compile(r"\w+|[^\s\w]")
+_NUMBER_PATTERN = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)")
+_PUNCTUATION_CHARS = frozenset(string.punctuation)
+
+
+def _decode_html_entity(match: re.Match) -> str:
+    return _HTML_ENTITIES[match.group()]
 
 
 def _remove_html_tags(text: str) -> str:
     """
-    Removes HTML tags from a string.
+    Removes HTML tags from a string, except the "<3" heart symbol, and
+    decodes the common HTML entities (`&amp;`, `&lt;`, `&quot;`...).
+
+    The entities are decoded after the tags are removed, so that a decoded
+    "&lt;" is never taken for the start of a tag. Each step is skipped for
+    texts without "<" (respectively "&").
 
     Args:
         text: The input string, potentially containing HTML tags.
@@ -13,18 +71,71 @@ def _remove_html_tags(text: str) -> str:
     Returns:
         The string with HTML tags removed.
     """
-    # A common regex to remove HTML tags. It matches '<' followed by
-    # any characters except '>', one or more times, followed by '>'.
-    clean_text = re.sub(r"<[^>]+>", "", text)
-    return clean_text
+    if "<" in text:
+        # A common regex to remove HTML tags. It matches '<' (not followed by
+        # '3') and any characters except '>', one or more times, then '>'.
+        text = _HTML_TAG_PATTERN.sub("", text)
+    if "&" in text:
+        text = _HTML_ENTITY_PATTERN.sub(_decode_html_entity, text)
+    return text
+
+
+# Deletion table of `str.translate` for the non-printable ASCII characters
+_ASCII_NON_PRINTABLE_TABLE = dict.fromkeys(
+    cp for cp in range(0x80) if not chr(cp).isprintable()
+)
+# Above this number of distinct non-printable characters, a text is filtered
+# character by character rather than with one `str.replace` per character.
+_MAX_REPLACED_CHARACTERS = 16
 
 
 def _remove_non_printable(text: str) -> str:
-    return "".join(c for c in text if c.isprintable())
+    """
+    Removes the characters for which `str.isprintable` is False.
+
+    Printable texts (most reviews) are returned as is after a single C-level
+    check. ASCII texts go through a deletion table, which CPython applies
+    in a tight loop. Other texts usually contain a few distinct non-printable
+    characters (e.g. "\x96" or "\x85" in IMDB reviews), each of which is
+    removed with `str.replace`.
+    """
+    if text.isprintable():
+        return text
+    if text.isascii():
+        return text.translate(_ASCII_NON_PRINTABLE_TABLE)
+    non_printable = [char for char in set(text) if not char.isprintable()]
+    if len(non_printable) > _MAX_REPLACED_CHARACTERS:
+        return "".join(filter(str.isprintable, text))
+    for char in non_printable:
+        text = text.replace(char, "")
+    return text
 
 
 assert _remove_non_printable("Hello\x00World") == "HelloWorld"
 assert _remove_non_printable("Hello\x09World") == "HelloWorld"
+assert _remove_non_printable("caf\xe9\x96 \u2028ok\U0001f600\U000e0001") == (
+    "caf\xe9 ok\U0001f600"
+)
+
+# Exhaustive test: same result as `str.isprintable` for every code point, in
+# ASCII texts, in texts with a few non-printable characters, and in texts
+# with many of them. Only the BMP is checked on import; running this module
+# as a script checks all the planes (about 0.5s more).
+_n_code_points = 0x110000 if __name__ == "__main__" else 0x10000
+_characters = (
+    array("I", range(_n_code_points)).tobytes().decode("utf-32-le", "surrogatepass")
+)
+assert list(map(ord, _characters)) == list(range(_n_code_points))
+_expected = "".join(filter(str.isprintable, _characters))
+assert _remove_non_printable(_characters[:0x80]) == _characters[0x20:0x7F]
+assert _remove_non_printable(_characters) == _expected
+assert (
+    "".join(
+        _remove_non_printable(_characters[i : i + _MAX_REPLACED_CHARACTERS])
+        for i in range(0, _n_code_points, _MAX_REPLACED_CHARACTERS)
+    )
+    == _expected
+)
 
 # Tests for _remove_html_tags
 assert _remove_html_tags("This is <b>bold</b> text.") == "This is bold text."
@@ -39,6 +150,11 @@ assert (
     _remove_html_tags("Text with <img src='image.png'> an image.")
     == "Text with  an image."
 )
+assert _remove_html_tags("I love it <3 <br />Really<>") == "I love it <3 Really<>"
+assert _remove_html_tags("Tom &amp; Jerry &lt;b&gt; &quot;<i>x</i>&quot;") == (
+    'Tom & Jerry <b> "x"'
+)
+assert _remove_html_tags("&amp;lt; &copy; & <br />") == "&lt; &copy; & "
 
 
 def _to_lowercase_if_needed(text: str, to_lowercase_flag: bool) -> str:
@@ -82,11 +198,9 @@ def _replace_numbers_if_needed(
     if replacement_token is None:
         return tokens
 
-    pattern = r"^[+-]?(\d+(\.\d*)?|\.\d+)$"
-
     _tokens = []
     for token in tokens:
-        if re.fullmatch(pattern, token):
+        if _NUMBER_PATTERN.fullmatch(token):
             _tokens.append(replacement_token)
         else:
             _tokens.append(token)
@@ -135,7 +249,7 @@ def _tokenize_text(text: str, tokenize_on_punctuation_flag: bool) -> list[str]:
     """
     if tokenize_on_punctuation_flag:
         # Regex to find words (alphanumeric + underscore) or any non-whitespace, non-word character (punctuation)
-        tokens = re.findall(r"\w+|[^\s\w]", text)
+        tokens = _TOKEN_PATTERN.findall(text)
     else:
         # Splits by any whitespace and handles multiple spaces, leading/trailing spaces.
         tokens = text.split()
@@ -175,12 +289,11 @@ def _remove_punctuation_tokens_if_needed(
     if not remove_punctuation_flag:
         return tokens
 
-    punctuation_chars = set(string.punctuation)
     # A token is removed if it's not empty and all its characters are punctuation characters.
     return [
         token
         for token in tokens
-        if not (token and all(char in punctuation_chars for char in token))
+        if not (token and all(char in _PUNCTUATION_CHARS for char in token))
     ]
 
 
@@ -212,13 +325,14 @@ assert _remove_punctuation_tokens_if_needed(["a-b"], True) == [
 
 
 def _get_corpus_token_frequencies(
-    list_of_token_lists: list[list[str]],
+    list_of_token_lists: Iterable[list[str]],
 ) -> tuple[collections.Counter[str], int]:
     """
     Calculates the frequency of each token in the entire corpus and the total token count.
 
     Args:
-        list_of_token_lists: A list where each inner list contains tokens of a document.
+        list_of_token_lists: An iterable where each item contains tokens of a document.
+                             It is consumed once, so it can be a generator.
 
     Returns:
         A tuple containing:
@@ -326,9 +440,548 @@ assert _filter_tokens_by_set(corpus_to_filter, to_remove_all) == [[], []]
 assert _filter_tokens_by_set([[]], {"a"}) == [[]]
 
 
+# --- Integer Token IDs ---
+
+
+class TokenIdCorpus:
+    """
+    Tokenized corpus stored CSR-style: the token IDs of all documents in one
+    flat `int32` buffer, plus an `offsets` array such that the IDs of document
+    `i` are `ids[offsets[i]:offsets[i + 1]]`.
+
+    Compared to a list of lists of strings, this costs 4 bytes per token and
+    lets corpus-wide statistics run on NumPy arrays.
+
+    Args:
+        ids: Flat buffer of token IDs.
+        offsets: Start of each document in `ids`, followed by `len(ids)`.
+        vocabulary: The vocabulary the IDs refer to.
+    """
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray, vocabulary: Vocabulary):
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.vocabulary = vocabulary
+        assert self.offsets.ndim == 1 and len(self.offsets) >= 1
+        assert self.offsets[0] == 0 and self.offsets[-1] == len(self.ids)
+
+    @classmethod
+    def from_id_sequences(
+        cls, id_sequences: Iterable[array], vocabulary: Vocabulary
+    ) -> "TokenIdCorpus":
+        """Builds a corpus from the `array('I')` IDs of each document."""
+        flat_ids = array("I")
+        offsets = [0]
+        for token_ids in id_sequences:
+            flat_ids.extend(token_ids)
+            offsets.append(len(flat_ids))
+        # IDs are smaller than the vocabulary size, far below 2**31, so the
+        # unsigned buffer can be viewed as int32 without copying.
+        ids = np.frombuffer(flat_ids, dtype=np.uint32).view(np.int32)
+        return cls(ids, np.array(offsets, dtype=np.int64), vocabulary)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self.ids[self.offsets[index] : self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield self.ids[start:end]
+
+    def to_token_lists(self) -> list[list[str]]:
+        """Decodes the corpus back to a list of lists of tokens."""
+        decode = self.vocabulary.decode
+        return [decode(token_ids.tolist()) for token_ids in self]
+
+    @classmethod
+    def from_token_lists(
+        cls,
+        list_of_token_lists: Iterable[list[str]],
+        vocabulary: Vocabulary | None = None,
+    ) -> "TokenIdCorpus":
+        """Encodes a tokenized corpus, with a new vocabulary if none is given."""
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        return cls.from_id_sequences(
+            map(vocabulary.encode, list_of_token_lists), vocabulary
+        )
+
+    def token_counts(self) -> np.ndarray:
+        """
+        Returns the collection frequency of every vocabulary ID: its number of
+        occurrences in the corpus.
+        """
+        return np.bincount(self.ids, minlength=len(self.vocabulary))
+
+    def document_frequencies(self) -> np.ndarray:
+        """
+        Returns the document frequency of every vocabulary ID: the number of
+        documents it appears in at least once.
+        """
+        vocab_size = len(self.vocabulary)
+        id_bits = max(vocab_size - 1, 1).bit_length()
+        # One uint32 key per (document, ID) pair, the document index in the high
+        # bits. Once sorted, the repetitions of an ID inside a document are
+        # adjacent and only the first one of each run is kept. Documents go by
+        # blocks small enough for their index to fit in the remaining bits
+        # (uint32 keys sort about twice as fast as int64 ones, and masking the
+        # ID back out is cheaper than a modulo).
+        block_size = 1 << (32 - id_bits)
+        first_ids = [np.empty(0, dtype=np.uint32)]
+        for block_start in range(0, len(self), block_size):
+            offsets = self.offsets[block_start : block_start + block_size + 1]
+            keys = np.repeat(
+                np.arange(len(offsets) - 1, dtype=np.uint32) << id_bits,
+                np.diff(offsets),
+            )
+            keys |= self.ids[offsets[0] : offsets[-1]].view(np.uint32)
+            keys.sort()
+            is_first = np.empty(len(keys), dtype=bool)
+            is_first[:1] = True
+            np.not_equal(keys[1:], keys[:-1], out=is_first[1:])
+            first_ids.append(keys.compress(is_first) & ((1 << id_bits) - 1))
+        return np.bincount(np.concatenate(first_ids), minlength=vocab_size)
+
+    def remove_high_frequency_ids(
+        self, threshold: float, by: Literal["collection", "document"] = "collection"
+    ) -> "TokenIdCorpus":
+        """
+        Returns a new corpus without the IDs whose relative frequency exceeds
+        the threshold.
+
+        Args:
+            threshold: The frequency threshold (0.0 to 1.0). IDs with a relative
+                       frequency > threshold are removed.
+            by: "collection" to use count / total tokens (as in `preprocess`),
+                or "document" to use document frequency / number of documents
+                (as in the `max_df` filters of exercises 1 and 2).
+
+        Returns:
+            The filtered corpus, or the corpus itself if it has no tokens.
+
+        Raises:
+            ValueError: If `threshold` is not within [0.0, 1.0] or `by` is unknown.
+        """
+        if not 0.0 <= threshold <= 1.0:
+            raise ValueError("threshold must be between 0.0 and 1.0.")
+        if by == "collection":
+            frequencies, total = self.token_counts(), len(self.ids)
+        elif by == "document":
+            frequencies, total = self.document_frequencies(), len(self)
+        else:
+            raise ValueError(f"Unknown frequency type: {by!r}")
+
+        if len(self.ids) == 0:
+            return self
+        return self.remove_ids(frequencies / total > threshold)
+
+    def remove_ids(self, ids_to_remove: np.ndarray) -> "TokenIdCorpus":
+        """
+        Returns a new corpus without the occurrences of some IDs.
+
+        Args:
+            ids_to_remove: Boolean mask over the vocabulary, True for the IDs
+                           to remove.
+        """
+        remove = ids_to_remove.take(self.ids)
+        # Each offset moves back by the number of removed tokens before it.
+        removed_before = np.searchsorted(np.flatnonzero(remove), self.offsets)
+        return TokenIdCorpus(
+            self.ids.compress(~remove), self.offsets - removed_before, self.vocabulary
+        )
+
+
+# Tests for TokenIdCorpus
+vocab2 = Vocabulary()
+id_corpus1 = TokenIdCorpus.from_id_sequences(
+    [vocab2.encode(tokens) for tokens in [["a", "b", "a"], [], ["b", "c"]]], vocab2
+)
+assert len(id_corpus1) == 3
+assert id_corpus1.offsets.tolist() == [0, 3, 3, 5]
+assert id_corpus1[2].tolist() == [1, 2] and id_corpus1[-2].tolist() == []
+assert id_corpus1.to_token_lists() == [["a", "b", "a"], [], ["b", "c"]]
+assert id_corpus1.token_counts().tolist() == [2, 2, 1]
+id_corpus2 = id_corpus1.remove_ids(np.array([True, False, False]))
+assert id_corpus2.to_token_lists() == [["b"], [], ["b", "c"]]
+assert id_corpus2.offsets.tolist() == [0, 1, 1, 3]
+assert TokenIdCorpus.from_id_sequences([], vocab2).to_token_lists() == []
+assert id_corpus1.document_frequencies().tolist() == [1, 2, 1]
+
+# Same documents as the `remove_high_df_tokens` example of exercise 2
+id_corpus3 = TokenIdCorpus.from_token_lists(
+    [["good", "movie", "the"], ["the", "bad", "movie"], ["the", "movie", "average"]]
+)
+assert id_corpus3.remove_high_frequency_ids(0.7, by="document").to_token_lists() == [
+    ["good"],
+    ["bad"],
+    ["average"],
+]
+assert id_corpus3.remove_high_frequency_ids(0.2).to_token_lists() == [
+    ["good"],
+    ["bad"],
+    ["average"],
+]
+
+# Parity with the Counter/set based functions on a random corpus
+_rng = random.Random(0)
+_random_corpus = [
+    [f"w{_rng.randint(0, 30)}" for _ in range(_rng.randint(0, 40))] for _ in range(200)
+]
+id_corpus4 = TokenIdCorpus.from_token_lists(_random_corpus)
+_counts, _total = _get_corpus_token_frequencies(_random_corpus)
+_doc_counts = collections.Counter(t for doc in _random_corpus for t in set(doc))
+assert (
+    dict(zip(id_corpus4.vocabulary.id_to_token, id_corpus4.token_counts())) == _counts
+)
+assert (
+    dict(zip(id_corpus4.vocabulary.id_to_token, id_corpus4.document_frequencies()))
+    == _doc_counts
+)
+# With 2**19 + 1 IDs, the document frequencies go by blocks of 4096 documents
+_big_vocabulary = Vocabulary()
+_big_vocabulary.id_to_token = [""] * ((1 << 19) + 1)
+_id_lists = [
+    [
+        _rng.choice([0, 1 << 19, _rng.randrange(1 << 19)])
+        for _ in range(_rng.randint(0, 5))
+    ]
+    for _ in range(9000)
+]
+_big_df = TokenIdCorpus.from_id_sequences(
+    [array("I", _ids) for _ids in _id_lists], _big_vocabulary
+).document_frequencies()
+assert len(_big_df) == len(_big_vocabulary)
+assert dict(zip(np.flatnonzero(_big_df).tolist(), _big_df[_big_df > 0])) == (
+    collections.Counter(_id for _ids in _id_lists for _id in set(_ids))
+)
+for _threshold in [0.0, 0.03, 0.04, 0.3, 1.0]:
+    assert id_corpus4.remove_high_frequency_ids(
+        _threshold
+    ).to_token_lists() == _filter_tokens_by_set(
+        _random_corpus, _identify_high_freq_tokens(_counts, _total, _threshold)
+    )
+    _high_df_tokens = {t for t, df in _doc_counts.items() if df / 200 > _threshold}
+    assert id_corpus4.remove_high_frequency_ids(
+        _threshold, by="document"
+    ).to_token_lists() == _filter_tokens_by_set(_random_corpus, _high_df_tokens)
+
+
 # --- Main Pre-processing Function ---
 
 
+def _validate_preprocess_options(
+    high_freq_term_threshold: float | None, number_replacement_token: str | None
+) -> None:
+    """
+    Checks the options of `preprocess`.
+
+    Raises:
+        ValueError: If `high_freq_term_threshold` is not within [0.0, 1.0], or if
+                    `number_replacement_token` contains punctuation or spaces.
+    """
+    if high_freq_term_threshold is not None and not (
+        0.0 <= high_freq_term_threshold <= 1.0
+    ):
+        raise ValueError(
+            "high_freq_term_threshold must be between 0.0 and 1.0, or None."
+        )
+
+    if number_replacement_token is not None:
+        if any(char in number_replacement_token for char in string.punctuation):
+            raise ValueError(
+                "number_replacement_token should not contain any special characters or spaces."
+            )
+        if any(char in number_replacement_token for char in " "):
+            raise ValueError("number_replacement_token should not contain any spaces.")
+
+
+def _remove_high_freq_tokens(
+    list_of_token_lists: list[list[str]],
+    token_frequencies: collections.Counter[str],
+    total_tokens: int,
+    threshold: float,
+) -> list[list[str]]:
+    """
+    Removes from the corpus the tokens whose frequency (count/total_tokens)
+    exceeds the threshold.
+
+    Args:
+        list_of_token_lists: A list where each inner list contains tokens of a document.
+        token_frequencies: The token frequencies of the whole corpus.
+        total_tokens: The total number of tokens in the corpus.
+        threshold: The frequency threshold (0.0 to 1.0).
+
+    Returns:
+        The filtered corpus, or the corpus as is if it contains no tokens.
+    """
+    if total_tokens == 0:
+        return list_of_token_lists
+
+    tokens_to_remove = _identify_high_freq_tokens(
+        token_frequencies, total_tokens, threshold
+    )
+
+    return _filter_tokens_by_set(list_of_token_lists, tokens_to_remove)
+
+
+def _remove_corpus_high_freq_tokens(
+    list_of_token_lists: list[list[str]], threshold: float
+) -> list[list[str]]:
+    """`_remove_high_freq_tokens`, computing the token frequencies of the corpus."""
+    token_frequencies, total_tokens = _get_corpus_token_frequencies(list_of_token_lists)
+    return _remove_high_freq_tokens(
+        list_of_token_lists, token_frequencies, total_tokens, threshold
+    )
+
+
+def _run_stage[T](stage: str, function: Callable[..., T], value, *args) -> T:
+    """
+    Returns `function(value, *args)`, recorded as a call of `stage` if a
+    profiler is enabled.
+    """
+    profiler = current_profiler()
+    if profiler is None:
+        return function(value, *args)
+    return profiler.run(stage, function, value, *args)
+
+
+class Preprocessor:
+    """
+    The pre-processing of `preprocess`, configured once and reusable.
+
+    The options are validated, and the patterns and tables of the steps
+    compiled, when the preprocessor is created. A review then goes through
+    one pass over its text (non-printable characters, HTML tags, lowercase,
+    tokenization) and a single pass over its tokens, which both drops the
+    punctuation tokens and replaces the numbers.
+
+    Example:
+        preprocessor = Preprocessor(to_lowercase=True, remove_punctuation_tokens=True)
+        preprocessor("A <b>great</b> movie!")  # ["a", "great", "movie"]
+        preprocessor.map(reviews)  # With the corpus-wide step
+
+    Args:
+        tokenize_on_punctuation: See `preprocess`.
+        to_lowercase: See `preprocess`.
+        remove_punctuation_tokens: See `preprocess`.
+        high_freq_term_threshold: See `preprocess`. Only used by `map`.
+        number_replacement_token: See `preprocess`.
+        remove_non_printable: See `preprocess`.
+
+    Raises:
+        ValueError: If an option is invalid (see `preprocess`).
+    """
+
+    def __init__(
+        self,
+        tokenize_on_punctuation: bool = True,
+        to_lowercase: bool = False,
+        remove_punctuation_tokens: bool = False,
+        high_freq_term_threshold: float | None = None,
+        number_replacement_token: str | None = None,
+        remove_non_printable: bool = True,
+    ):
+        _validate_preprocess_options(high_freq_term_threshold, number_replacement_token)
+        self.tokenize_on_punctuation = tokenize_on_punctuation
+        self.to_lowercase = to_lowercase
+        self.remove_punctuation_tokens = remove_punctuation_tokens
+        self.high_freq_term_threshold = high_freq_term_threshold
+        self.number_replacement_token = number_replacement_token
+        self.remove_non_printable = remove_non_printable
+        # Neither of them returns empty tokens
+        self._tokenize = (
+            _TOKEN_PATTERN.findall if tokenize_on_punctuation else str.split
+        )
+
+    @property
+    def review_options(self) -> dict:
+        """The options of the per-review steps (all but the corpus-wide one)."""
+        return {
+            "tokenize_on_punctuation": self.tokenize_on_punctuation,
+            "to_lowercase": self.to_lowercase,
+            "remove_punctuation_tokens": self.remove_punctuation_tokens,
+            "number_replacement_token": self.number_replacement_token,
+            "remove_non_printable": self.remove_non_printable,
+        }
+
+    def cache_options(self) -> dict:
+        """`CorpusCache` options of the tokens returned by `__call__`."""
+        return dict(
+            function="Preprocessor",
+            version=PREPROCESSING_VERSION,
+            **self.review_options,
+        )
+
+    def _process_tokens(self, tokens: list[str]) -> list[str]:
+        """Punctuation token removal and number replacement, in a single pass."""
+        replacement = self.number_replacement_token
+        # A (non-empty) token is only made of punctuation if stripping it of
+        # the punctuation characters leaves nothing.
+        if replacement is None:
+            if not self.remove_punctuation_tokens:
+                return tokens
+            return [token for token in tokens if token.strip(string.punctuation)]
+        # Most tokens are words, that `str.isalpha` rules out faster than the
+        # regex.
+        is_number = _NUMBER_PATTERN.fullmatch
+        if self.remove_punctuation_tokens:
+            return [
+                replacement if not token.isalpha() and is_number(token) else token
+                for token in tokens
+                if token.strip(string.punctuation)
+            ]
+        return [
+            replacement if not token.isalpha() and is_number(token) else token
+            for token in tokens
+        ]
+
+    def __call__(self, review_text: str) -> list[str]:
+        """
+        Applies the per-review steps (everything but the corpus-wide
+        high-frequency term removal) to a single review.
+
+        Returns:
+            The tokens of the review.
+        """
+        profiler = current_profiler()
+        if profiler is not None:
+            return self._profile(profiler, review_text)
+
+        if self.remove_non_printable:
+            review_text = _remove_non_printable(review_text)
+        text = _remove_html_tags(review_text)
+        if self.to_lowercase:
+            text = text.lower()
+        return self._process_tokens(self._tokenize(text))
+
+    def _profile(self, profiler: StageProfiler, review_text: str) -> list[str]:
+        """`__call__`, with each enabled step recorded by `profiler`."""
+        if self.remove_non_printable:
+            review_text = profiler.run(
+                "non_printable", _remove_non_printable, review_text
+            )
+        text = profiler.run("html", _remove_html_tags, review_text)
+        if self.to_lowercase:
+            text = profiler.run("lowercase", str.lower, text)
+        tokens = profiler.run("tokenize", self._tokenize, text)
+        if self.remove_punctuation_tokens or self.number_replacement_token is not None:
+            tokens = profiler.run("punctuation_numbers", self._process_tokens, tokens)
+        return tokens
+
+    def _map_reviews(self, reviews: list[str]) -> list[list[str]]:
+        return [self(review) for review in reviews]
+
+    def map(
+        self,
+        reviews: list[str],
+        vocabulary: Vocabulary | None = None,
+        cache: CorpusCache | None = None,
+    ) -> list[list[str]] | TokenIdCorpus:
+        """
+        Pre-processes a corpus: the per-review steps, then the corpus-wide
+        high-frequency term removal (if `high_freq_term_threshold` is set).
+
+        Args:
+            reviews: A list of raw review strings.
+            vocabulary: See `preprocess`.
+            cache: See `preprocess`.
+
+        Returns:
+            See `preprocess`.
+        """
+        if not reviews:
+            if vocabulary is not None:
+                return TokenIdCorpus.from_id_sequences([], vocabulary)
+            return []
+
+        reviews_tokens: Iterable[list[str]]
+        if cache is not None:
+            reviews_tokens = cache.map(self._map_reviews, reviews, self.cache_options())
+        else:
+            reviews_tokens = map(self, reviews)
+
+        threshold = self.high_freq_term_threshold
+        if vocabulary is not None:
+            # The token lists are encoded one review at a time, so only the IDs of
+            # the whole corpus are held in memory.
+            id_corpus = TokenIdCorpus.from_id_sequences(
+                map(vocabulary.encode, reviews_tokens), vocabulary
+            )
+            if threshold is None:
+                return id_corpus
+            # (Corpus-wide) High-Frequency Term Removal, on the ID arrays
+            return _run_stage(
+                "high_freq_removal",
+                TokenIdCorpus.remove_high_frequency_ids,
+                id_corpus,
+                threshold,
+            )
+
+        processed_reviews: list[list[str]] = list(reviews_tokens)
+        if threshold is None:
+            return processed_reviews
+
+        # (Corpus-wide) High-Frequency Term Removal
+        return _run_stage(
+            "high_freq_removal",
+            _remove_corpus_high_freq_tokens,
+            processed_reviews,
+            threshold,
+        )
+
+
+# Tests for Preprocessor: same tokens as the steps applied one by one
+def _apply_steps(review_text: str, options: dict) -> list[str]:
+    if options["remove_non_printable"]:
+        review_text = _remove_non_printable(review_text)
+    text = _remove_html_tags(review_text)
+    text = _to_lowercase_if_needed(text, options["to_lowercase"])
+    tokens = _tokenize_text(text, options["tokenize_on_punctuation"])
+    tokens = _remove_punctuation_tokens_if_needed(
+        tokens, options["remove_punctuation_tokens"]
+    )
+    return _replace_numbers_if_needed(tokens, options["number_replacement_token"])
+
+
+_reviews = [
+    "It's a <b>GREAT</b> movie... 10/10,\tsaw it in 1999 (twice)!",
+    "Scores: -3.5 .5 +7 3. 1e3 \u0663\u0662 -- ?! \x00hidden\x85<br />caf\xe9",
+    "",
+]
+for _flags in range(16):
+    _options = {
+        "tokenize_on_punctuation": bool(_flags & 1),
+        "to_lowercase": bool(_flags & 2),
+        "remove_punctuation_tokens": bool(_flags & 4),
+        "number_replacement_token": "NUM" if _flags & 8 else None,
+        "remove_non_printable": _flags % 3 != 0,
+    }
+    _preprocessor = Preprocessor(**_options)
+    assert _preprocessor.review_options == _options
+    for _review in _reviews:
+        assert _preprocessor(_review) == _apply_steps(_review, _options), _options
+
+_preprocessor = Preprocessor(to_lowercase=True, remove_punctuation_tokens=True)
+assert _preprocessor("A <b>great</b> movie!") == ["a", "great", "movie"]
+assert _preprocessor.map([]) == []
+assert Preprocessor(high_freq_term_threshold=0.5).map(["a a b", "a c"]) == [
+    ["b"],
+    ["c"],
+]
+
+try:
+    Preprocessor(number_replacement_token="<NUM>")
+    assert False, "ValueError not raised for an invalid number_replacement_token"
+except ValueError:
+    pass  # Expected
+
+
 def preprocess(
     reviews: list[str],
     tokenize_on_punctuation: bool = True,
@@ -337,7 +990,9 @@ def preprocess(
     high_freq_term_threshold: float | None = None,
     number_replacement_token: str | None = None,
     remove_non_printable: bool = True,
-) -> list[list[str]]:
+    vocabulary: Vocabulary | None = None,
+    cache: CorpusCache | None = None,
+) -> list[list[str]] | TokenIdCorpus:
     """
     Pre-processes a list of raw review strings according to specified options.
     HTML tags are always removed as a first step.
@@ -369,79 +1024,40 @@ def preprocess(
                                   numbers are not replaced. Default is None.
                                   Should not contain any special characters or spaces.
         remove_non_printable: If True, remove non-printable characters.
+        vocabulary: If provided, the tokens are mapped to integer IDs of this
+                    vocabulary (which grows with new tokens) and the corpus is
+                    returned as a `TokenIdCorpus`. The high-frequency term
+                    removal then runs on the ID arrays.
+        cache: If provided, the tokens of the reviews (before the
+               corpus-wide step) are read from this cache, and only the
+               reviews that are not in it yet are processed.
+
+    Inside a `common.profiling.profile()` block, the calls, time and tokens of each
+    step are recorded by the profiler.
 
     Returns:
         A list of lists of strings, where each inner list contains the
-        processed tokens for a review.
+        processed tokens for a review. If `vocabulary` is provided, a
+        `TokenIdCorpus` holding the IDs of the same tokens.
 
     Raises:
         ValueError: If `high_freq_term_threshold` is provided but not
                     within the range [0.0, 1.0].
     """
     if not reviews:
+        if vocabulary is not None:
+            return TokenIdCorpus.from_id_sequences([], vocabulary)
         return []
 
-    if high_freq_term_threshold is not None and not (
-        0.0 <= high_freq_term_threshold <= 1.0
-    ):
-        raise ValueError(
-            "high_freq_term_threshold must be between 0.0 and 1.0, or None."
-        )
-
-    if number_replacement_token is not None:
-        if any(char in number_replacement_token for char in string.punctuation):
-            raise ValueError(
-                "number_replacement_token should not contain any special characters or spaces."
-            )
-        if any(char in number_replacement_token for char in " "):
-            raise ValueError("number_replacement_token should not contain any spaces.")
-
-    processed_reviews_intermediate: list[list[str]] = []
-
-    for review_text in reviews:
-        # Remove non-printable characters
-        if remove_non_printable:
-            review_text = _remove_non_printable(review_text)
-
-        # HTML Tag Removal (always on)
-        current_text = _remove_html_tags(review_text)
-
-        # Lowercase
-        current_text = _to_lowercase_if_needed(current_text, to_lowercase)
-
-        # Tokenization
-        tokens = _tokenize_text(current_text, tokenize_on_punctuation)
-
-        # Punctuation Token Removal
-        tokens = _remove_punctuation_tokens_if_needed(tokens, remove_punctuation_tokens)
-
-        # Number Replacement
-        tokens = _replace_numbers_if_needed(tokens, number_replacement_token)
-
-        processed_reviews_intermediate.append(tokens)
-
-    if high_freq_term_threshold is None:
-        return processed_reviews_intermediate
-
-    # 6. (Corpus-wide) High-Frequency Term Removal
-    token_frequencies, total_tokens = _get_corpus_token_frequencies(
-        processed_reviews_intermediate
-    )
-
-    if (
-        total_tokens == 0
-    ):  # If corpus is empty after initial processing, return it as is
-        return processed_reviews_intermediate
-
-    tokens_to_remove = _identify_high_freq_tokens(
-        token_frequencies, total_tokens, high_freq_term_threshold
+    preprocessor = Preprocessor(
+        tokenize_on_punctuation=tokenize_on_punctuation,
+        to_lowercase=to_lowercase,
+        remove_punctuation_tokens=remove_punctuation_tokens,
+        high_freq_term_threshold=high_freq_term_threshold,
+        number_replacement_token=number_replacement_token,
+        remove_non_printable=remove_non_printable,
     )
-
-    final_processed_reviews = _filter_tokens_by_set(
-        processed_reviews_intermediate, tokens_to_remove
-    )
-
-    return final_processed_reviews
+    return preprocessor.map(reviews, vocabulary=vocabulary, cache=cache)
 
 
 # --- Tests for preprocess_reviews ---
@@ -609,3 +1225,459 @@ try:
     assert False, "S9 failed: ValueError not raised for invalid threshold"
 except ValueError:
     pass  # Expected
+
+# Scenario 10: Integer ID output gives the same tokens as the default output
+for _reviews, _options in [
+    (reviews0, {"tokenize_on_punctuation": False}),
+    (reviews5, {"to_lowercase": True, "high_freq_term_threshold": 0.3}),
+    (reviews5, {"to_lowercase": True, "high_freq_term_threshold": 0.2}),
+    (
+        reviews7,
+        {
+            "to_lowercase": True,
+            "number_replacement_token": "NUMTOKEN",
+            "tokenize_on_punctuation": True,
+            "remove_punctuation_tokens": True,
+            "high_freq_term_threshold": 0.2,
+        },
+    ),
+    (reviews8, {"remove_punctuation_tokens": True, "high_freq_term_threshold": 0.1}),
+    ([], {}),
+]:
+    result10 = preprocess(_reviews, vocabulary=Vocabulary(), **_options)
+    assert isinstance(result10, TokenIdCorpus)
+    assert result10.to_token_lists() == preprocess(_reviews, **_options), (
+        f"S10 failed: {_options}"
+    )
+
+# The vocabulary is shared: IDs stay the same across calls
+vocab10 = Vocabulary()
+ids10a = preprocess(["the cat sat"], vocabulary=vocab10)
+ids10b = preprocess(["the dog sat"], vocabulary=vocab10)
+assert ids10a.ids.tolist() == [0, 1, 2] and ids10b.ids.tolist() == [0, 3, 2]
+
+
+# --- Streaming Pre-processing ---
+
+
+class ReviewFiles:
+    """
+    Re-iterable collection of review files, read lazily.
+
+    Every iteration globs the patterns again and yields the content of each
+    matching file, so the reviews never have to be held in memory together.
+    Files are yielded pattern by pattern, sorted by path within a pattern.
+    They are read by `common.review_loader.read_texts`, with at most
+    `max_in_flight` reads at a time.
+
+    Args:
+        *patterns: Glob patterns relative to `base_dir`, e.g. "train/pos/*.txt".
+        base_dir: Directory the patterns are relative to.
+        max_in_flight: See `common.review_loader.read_texts`.
+    """
+
+    def __init__(
+        self,
+        *patterns: str,
+        base_dir: str | Path = ".",
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ):
+        self.patterns = patterns
+        self.base_dir = Path(base_dir)
+        self.max_in_flight = max_in_flight
+
+    def _paths(self) -> Iterator[Path]:
+        for pattern in self.patterns:
+            yield from sorted(self.base_dir.glob(pattern))
+
+    def __iter__(self) -> Iterator[str]:
+        return read_texts(self._paths(), self.max_in_flight)
+
+
+def preprocess_stream(
+    reviews: Iterable[str],
+    tokenize_on_punctuation: bool = True,
+    to_lowercase: bool = False,
+    remove_punctuation_tokens: bool = False,
+    high_freq_term_threshold: float | None = None,
+    number_replacement_token: str | None = None,
+    remove_non_printable: bool = True,
+) -> Iterator[list[str]]:
+    """
+    Streaming version of `preprocess`: yields the tokens of each review lazily
+    instead of building the whole processed corpus in memory.
+
+    Without `high_freq_term_threshold`, `reviews` is consumed once, one review
+    at a time. With it, the high-frequency term removal becomes a two-pass
+    operation: a first pass over `reviews` only counts the tokens, then a
+    second pass processes the reviews again and filters them. Memory use is
+    then bounded by the size of the vocabulary rather than the corpus, but
+    `reviews` must be iterable twice (e.g. a list or a `ReviewFiles`, not a
+    generator).
+
+    The options are the same as for `preprocess`, and the yielded token lists
+    are the ones `preprocess` would return.
+
+    Args:
+        reviews: An iterable of raw review strings.
+        tokenize_on_punctuation: See `preprocess`.
+        to_lowercase: See `preprocess`.
+        remove_punctuation_tokens: See `preprocess`.
+        high_freq_term_threshold: See `preprocess`.
+        number_replacement_token: See `preprocess`.
+        remove_non_printable: See `preprocess`.
+
+    Returns:
+        An iterator over the processed tokens of each review.
+
+    Raises:
+        ValueError: If an option is invalid (see `preprocess`).
+        TypeError: If `high_freq_term_threshold` is set and `reviews` is a
+                   one-shot iterator.
+    """
+    preprocessor = Preprocessor(
+        tokenize_on_punctuation=tokenize_on_punctuation,
+        to_lowercase=to_lowercase,
+        remove_punctuation_tokens=remove_punctuation_tokens,
+        high_freq_term_threshold=high_freq_term_threshold,
+        number_replacement_token=number_replacement_token,
+        remove_non_printable=remove_non_printable,
+    )
+
+    if high_freq_term_threshold is not None and iter(reviews) is reviews:
+        raise TypeError(
+            "High-frequency term removal needs two passes over the reviews, "
+            "so reviews must be re-iterable (not a one-shot iterator)."
+        )
+
+    def process_reviews() -> Iterator[list[str]]:
+        return map(preprocessor, reviews)
+
+    if high_freq_term_threshold is None:
+        return process_reviews()
+
+    def filter_reviews() -> Iterator[list[str]]:
+        # First pass: only the token counts are kept.
+        token_frequencies, total_tokens = _get_corpus_token_frequencies(
+            process_reviews()
+        )
+        tokens_to_remove = (
+            _identify_high_freq_tokens(
+                token_frequencies, total_tokens, high_freq_term_threshold
+            )
+            if total_tokens > 0
+            else set()
+        )
+        del token_frequencies
+
+        # Second pass: process the reviews again and filter them.
+        for tokens in process_reviews():
+            yield [token for token in tokens if token not in tokens_to_remove]
+
+    return filter_reviews()
+
+
+# Tests for preprocess_stream
+assert list(preprocess_stream(reviews0, tokenize_on_punctuation=False)) == expected0
+assert (
+    list(preprocess_stream(iter(reviews1), tokenize_on_punctuation=False)) == expected1
+)
+assert (
+    list(preprocess_stream(reviews5, to_lowercase=True, high_freq_term_threshold=0.2))
+    == expected5_b
+)
+assert (
+    list(
+        preprocess_stream(
+            reviews7,
+            to_lowercase=True,
+            number_replacement_token="NUMTOKEN",
+            tokenize_on_punctuation=True,
+            remove_punctuation_tokens=True,
+            high_freq_term_threshold=0.2,
+        )
+    )
+    == expected7
+)
+assert (
+    list(
+        preprocess_stream(
+            reviews8,
+            to_lowercase=True,
+            tokenize_on_punctuation=True,
+            remove_punctuation_tokens=True,
+            high_freq_term_threshold=0.1,
+        )
+    )
+    == expected8
+)
+assert list(preprocess_stream([])) == []
+
+try:
+    preprocess_stream(iter(reviews5), high_freq_term_threshold=0.2)
+    assert False, "TypeError not raised for a one-shot iterator"
+except TypeError:
+    pass  # Expected
+
+try:
+    preprocess_stream(["a b c"], high_freq_term_threshold=1.1)
+    assert False, "ValueError not raised for invalid threshold"
+except ValueError:
+    pass  # Expected
+
+# Tests for ReviewFiles
+with tempfile.TemporaryDirectory() as _tmp_dir:
+    for _i, _review in enumerate(reviews5):
+        (Path(_tmp_dir) / f"{_i}_7.txt").write_text(_review, encoding="utf-8")
+    _review_files = ReviewFiles("*.txt", base_dir=_tmp_dir)
+    assert list(_review_files) == reviews5
+    assert (
+        list(
+            preprocess_stream(
+                _review_files, to_lowercase=True, high_freq_term_threshold=0.2
+            )
+        )
+        == expected5_b
+    )
+
+
+# --- Corpus-level Pre-processing with a Pool of Workers ---
+
+# Per-process options used by `preprocess_corpus`, set once per worker by
+# `_init_preprocess_worker` instead of being sent along with every chunk.
+_preprocess_worker_options: dict = {}
+
+
+def _init_preprocess_worker(preprocessor: Preprocessor, count_tokens: bool) -> None:
+    _preprocess_worker_options["preprocessor"] = preprocessor
+    _preprocess_worker_options["count_tokens"] = count_tokens
+
+
+def _preprocess_chunk(
+    reviews_chunk: list[str],
+) -> tuple[list[list[str]], collections.Counter[str], int]:
+    """
+    Applies the per-review steps of `preprocess` to a chunk of reviews.
+
+    Returns:
+        A tuple containing:
+            - The tokens of each review of the chunk.
+            - The token frequencies of the chunk (empty if counting is disabled).
+            - The number of tokens in the chunk (0 if counting is disabled).
+    """
+    preprocessor = _preprocess_worker_options["preprocessor"]
+    processed_chunk = [preprocessor(review) for review in reviews_chunk]
+
+    if not _preprocess_worker_options["count_tokens"]:
+        return processed_chunk, collections.Counter(), 0
+
+    token_frequencies, total_tokens = _get_corpus_token_frequencies(processed_chunk)
+    return processed_chunk, token_frequencies, total_tokens
+
+
+def preprocess_corpus(
+    reviews: list[str],
+    n_workers: int | None = None,
+    chunksize: int | None = None,
+    tokenize_on_punctuation: bool = True,
+    to_lowercase: bool = False,
+    remove_punctuation_tokens: bool = False,
+    high_freq_term_threshold: float | None = None,
+    number_replacement_token: str | None = None,
+    remove_non_printable: bool = True,
+    cache: CorpusCache | None = None,
+) -> list[list[str]]:
+    """
+    Same as `preprocess`, but the per-review steps run in a pool of worker
+    processes.
+
+    The reviews are split into chunks of consecutive reviews. Each worker
+    receives the options once, then processes whole chunks and also counts the
+    tokens of each chunk when `high_freq_term_threshold` is set. The chunk
+    counts are merged in the main process, where the high-frequency term
+    removal is applied. The output is identical to `preprocess`.
+
+    Args:
+        reviews: A list of raw review strings.
+        n_workers: Number of worker processes. Defaults to `os.cpu_count()`.
+                   With 1, the chunks are processed in the current process.
+        chunksize: Number of reviews per chunk. Defaults to splitting the
+                   corpus into about 4 chunks per worker.
+        tokenize_on_punctuation: See `preprocess`.
+        to_lowercase: See `preprocess`.
+        remove_punctuation_tokens: See `preprocess`.
+        high_freq_term_threshold: See `preprocess`.
+        number_replacement_token: See `preprocess`.
+        remove_non_printable: See `preprocess`.
+        cache: See `preprocess`. Only the reviews that are not cached yet are
+               sent to the workers.
+
+    Returns:
+        A list of lists of strings, where each inner list contains the
+        processed tokens for a review, in the order of `reviews`.
+
+    Raises:
+        ValueError: If an option is invalid (see `preprocess`), or if
+                    `n_workers` or `chunksize` is smaller than 1.
+    """
+    if not reviews:
+        return []
+
+    preprocessor = Preprocessor(
+        tokenize_on_punctuation=tokenize_on_punctuation,
+        to_lowercase=to_lowercase,
+        remove_punctuation_tokens=remove_punctuation_tokens,
+        high_freq_term_threshold=high_freq_term_threshold,
+        number_replacement_token=number_replacement_token,
+        remove_non_printable=remove_non_printable,
+    )
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers < 1:
+        raise ValueError("n_workers must be at least 1.")
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("chunksize must be at least 1.")
+
+    if cache is not None:
+        processed_reviews = cache.map(
+            functools.partial(
+                preprocess_corpus,
+                n_workers=n_workers,
+                chunksize=chunksize,
+                **preprocessor.review_options,
+            ),
+            reviews,
+            preprocessor.cache_options(),
+        )
+        if high_freq_term_threshold is None:
+            return processed_reviews
+        return _run_stage(
+            "high_freq_removal",
+            _remove_corpus_high_freq_tokens,
+            processed_reviews,
+            high_freq_term_threshold,
+        )
+
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(reviews) / (4 * n_workers)))
+    chunks = [reviews[i : i + chunksize] for i in range(0, len(reviews), chunksize)]
+    initargs = (preprocessor, high_freq_term_threshold is not None)
+
+    if n_workers == 1 or len(chunks) == 1:
+        _init_preprocess_worker(*initargs)
+        chunk_results = [_preprocess_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(
+            processes=min(n_workers, len(chunks)),
+            initializer=_init_preprocess_worker,
+            initargs=initargs,
+        ) as pool:
+            # `map` returns the chunk results in order, so the reviews keep their order.
+            chunk_results = pool.map(_preprocess_chunk, chunks, chunksize=1)
+
+    processed_reviews_intermediate: list[list[str]] = []
+    token_frequencies: collections.Counter[str] = collections.Counter()
+    total_tokens = 0
+    for processed_chunk, chunk_frequencies, chunk_total in chunk_results:
+        processed_reviews_intermediate.extend(processed_chunk)
+        token_frequencies.update(chunk_frequencies)
+        total_tokens += chunk_total
+
+    if high_freq_term_threshold is None:
+        return processed_reviews_intermediate
+
+    return _run_stage(
+        "high_freq_removal",
+        _remove_high_freq_tokens,
+        processed_reviews_intermediate,
+        token_frequencies,
+        total_tokens,
+        high_freq_term_threshold,
+    )
+
+
+# Tests for preprocess_corpus (in-process, with small chunks so that the chunk
+# results and counts have to be merged)
+for _reviews, _options in [
+    (reviews0, {"tokenize_on_punctuation": False}),
+    (reviews1, {"to_lowercase": True, "number_replacement_token": "NUMTOKEN"}),
+    (reviews5, {"to_lowercase": True, "high_freq_term_threshold": 0.2}),
+    (
+        reviews7,
+        {
+            "to_lowercase": True,
+            "number_replacement_token": "NUMTOKEN",
+            "tokenize_on_punctuation": True,
+            "remove_punctuation_tokens": True,
+            "high_freq_term_threshold": 0.2,
+        },
+    ),
+    (
+        reviews8,
+        {
+            "tokenize_on_punctuation": True,
+            "remove_punctuation_tokens": True,
+            "high_freq_term_threshold": 0.1,
+        },
+    ),
+    (reviews5 + reviews0 + reviews5, {"high_freq_term_threshold": 0.05}),
+]:
+    for _chunksize in [1, 2, None]:
+        assert preprocess_corpus(
+            _reviews, n_workers=1, chunksize=_chunksize, **_options
+        ) == preprocess(_reviews, **_options), (_reviews, _options, _chunksize)
+
+assert preprocess_corpus([], n_workers=1) == []
+
+try:
+    preprocess_corpus(["a b c"], n_workers=1, high_freq_term_threshold=1.1)
+    assert False, "ValueError not raised for invalid threshold"
+except ValueError:
+    pass  # Expected
+
+# Tests for the cache: same tokens as without it, and nothing is processed again
+with tempfile.TemporaryDirectory() as _cache_dir:
+    _cache = CorpusCache(_cache_dir)
+    _options = {"to_lowercase": True, "high_freq_term_threshold": 0.05}
+    _reviews = reviews5 + reviews0 + reviews5
+    assert preprocess(_reviews, cache=_cache, **_options) == preprocess(
+        _reviews, **_options
+    )
+    assert _cache.misses == len(_reviews)
+    assert preprocess_corpus(
+        _reviews, n_workers=1, cache=_cache, **_options
+    ) == preprocess(_reviews, **_options)
+    assert _cache.misses == len(_reviews)
+    assert preprocess(
+        reviews1, cache=_cache, vocabulary=Vocabulary()
+    ).to_token_lists() == preprocess(reviews1)
+
+# Tests for profiling: same tokens, every enabled step recorded
+_options = {
+    "to_lowercase": True,
+    "remove_punctuation_tokens": True,
+    "number_replacement_token": "NUM",
+    "high_freq_term_threshold": 0.2,
+}
+_expected = preprocess(reviews5, **_options)
+with profile() as _profiler:
+    assert preprocess(reviews5, **_options) == _expected
+    assert preprocess_corpus(reviews5, n_workers=1, **_options) == _expected
+_stats = _profiler.to_dict()
+assert list(_stats) == [
+    "non_printable",
+    "html",
+    "lowercase",
+    "tokenize",
+    "punctuation_numbers",
+    "high_freq_removal",
+]
+assert _stats["html"]["calls"] == 2 * len(reviews5)
+assert _stats["high_freq_removal"]["calls"] == 2
+assert _stats["high_freq_removal"]["tokens_out"] == 2 * sum(map(len, _expected))
+with profile() as _profiler:
+    preprocess(reviews5, vocabulary=Vocabulary(), high_freq_term_threshold=0.2)
+assert _profiler.to_dict()["high_freq_removal"]["tokens_out"] == sum(
+    map(len, preprocess(reviews5, high_freq_term_threshold=0.2))
+)
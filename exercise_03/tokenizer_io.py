@@ -0,0 +1,352 @@
+import json
+import mmap
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+
+from bpe import BPETokenizer
+from wordpiece import DoubleArrayTrie, WordPieceTokenizer
+
+# File layout (all integers little-endian):
+#   - MAGIC
+#   - Length of the header, as an uint32
+#   - Header: UTF-8 JSON with the tokenizer settings, the preprocess options,
+#     and the offset, length and item type of every section
+#   - Sections, each aligned on 8 bytes:
+#       "token_offsets": uint64, offsets of every token in "token_bytes" + 1
+#       "token_bytes": the tokens, UTF-8 encoded, one after the other
+#       "merges": int32, the token IDs (a, b) of every merge, by rank
+#       "trie_base", "trie_check", "trie_value": int32 (WordPiece only)
+MAGIC = b"DLNLPTOK"
+FORMAT_VERSION = 1
+
+_ALIGNMENT = 8
+
+
+def _little_endian(values: array) -> bytes:
+    """The bytes of an array, in little-endian order whatever the machine."""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _token_table(tokens: list[str]) -> tuple[array, bytes]:
+    """Encodes tokens as a UTF-8 blob and the offsets of each token in it."""
+    encoded = [token.encode("utf-8") for token in tokens]
+    offsets = array("Q", [0])
+    for token_bytes in encoded:
+        offsets.append(offsets[-1] + len(token_bytes))
+    return offsets, b"".join(encoded)
+
+
+def save_tokenizer(
+    path: str | Path,
+    tokenizer: BPETokenizer | WordPieceTokenizer,
+    preprocess_options: dict | None = None,
+) -> None:
+    """
+    Writes a trained tokenizer to a file that `TokenizerArtifact` can map
+    into memory, so that it does not have to be trained again.
+
+    Args:
+        path: The file to write.
+        tokenizer: A trained `BPETokenizer` or `WordPieceTokenizer`.
+        preprocess_options: The keyword arguments given to
+            `preprocessing.preprocess` to produce the words the tokenizer was
+            trained on, so that new reviews can be pre-processed the same way.
+    """
+    tokens = list(tokenizer.vocab)
+    merges = array(
+        "i",
+        [tokenizer.vocab[token] for pair in tokenizer.merges for token in pair],
+    )
+    token_offsets, token_bytes = _token_table(tokens)
+    sections: dict[str, tuple[str, bytes]] = {
+        "token_offsets": ("Q", _little_endian(token_offsets)),
+        "token_bytes": ("B", token_bytes),
+        "merges": ("i", _little_endian(merges)),
+    }
+
+    if isinstance(tokenizer, BPETokenizer):
+        settings = dict(
+            kind="bpe",
+            n_base_tokens=len(tokenizer.base_vocab),
+            num_merges=tokenizer.num_merges,
+            max_cache_size=tokenizer.max_cache_size,
+        )
+    elif isinstance(tokenizer, WordPieceTokenizer):
+        trie = tokenizer._trie
+        settings = dict(
+            kind="wordpiece",
+            vocab_size=tokenizer.vocab_size,
+            initial_vocab=sorted(tokenizer.initial_vocab),
+            max_word_length=tokenizer.max_word_length,
+            trie_alphabet=trie.alphabet,
+        )
+        for name in ("base", "check", "value"):
+            sections[f"trie_{name}"] = (
+                "i",
+                _little_endian(array("i", getattr(trie, name))),
+            )
+    else:
+        raise TypeError(
+            f"Expected a BPETokenizer or a WordPieceTokenizer, got {type(tokenizer)}."
+        )
+
+    # The section offsets depend on the header length, and the other way
+    # around: lay the sections out after the header until its length is the
+    # one they were laid out for. Longer headers only push the offsets (and
+    # their digits) further, so the length only grows until it is stable.
+    header = dict(
+        format_version=FORMAT_VERSION,
+        unk_token=tokenizer.unk_token,
+        preprocess_options=preprocess_options or {},
+        sections={},
+        **settings,
+    )
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    while True:
+        offset = len(MAGIC) + 4 + len(header_bytes)
+        layout = {}
+        for name, (typecode, data) in sections.items():
+            offset += -offset % _ALIGNMENT
+            layout[name] = [offset, len(data), typecode]
+            offset += len(data)
+        header["sections"] = layout
+        laid_out_header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(laid_out_header_bytes) == len(header_bytes):
+            header_bytes = laid_out_header_bytes
+            break
+        header_bytes = laid_out_header_bytes
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, (_, data) in sections.items():
+            offset = layout[name][0]
+            assert f.tell() <= offset, f"Section {name} overlaps the previous one."
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+
+
+class TokenizerArtifact:
+    """
+    A tokenizer saved with `save_tokenizer`, mapped into memory.
+
+    Opening the file only parses the small JSON header: the token table, the
+    merges and the WordPiece trie are read straight from the mapped file when
+    they are used. `to_tokenizer` rebuilds an encoder in milliseconds (the
+    WordPiece trie is used in place, without being copied).
+
+    Args:
+        path: The file written by `save_tokenizer`.
+
+    Attributes:
+        header: The settings of the tokenizer, and the layout of the file.
+        preprocess_options: The keyword arguments of `preprocessing.preprocess`
+                            saved with the tokenizer.
+
+    Raises:
+        ValueError: If the file is not a tokenizer saved by `save_tokenizer`.
+    """
+
+    def __init__(self, path: str | Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mmap[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a saved tokenizer.")
+            (header_length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+            header_start = len(MAGIC) + 4
+            self.header = json.loads(
+                self._mmap[header_start : header_start + header_length]
+            )
+            if self.header["format_version"] != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported format version {self.header['format_version']}."
+                )
+        except BaseException:
+            self._mmap.close()
+            raise
+        self.preprocess_options: dict = self.header["preprocess_options"]
+        self._buffer = memoryview(self._mmap)
+        self._token_offsets = self._section("token_offsets")
+        self._token_bytes = self._section("token_bytes")
+        self._merges = self._section("merges")
+
+    def _section(self, name: str) -> memoryview | array:
+        offset, length, typecode = self.header["sections"][name]
+        section = self._buffer[offset : offset + length].cast(typecode)
+        if sys.byteorder != "little" and section.itemsize > 1:
+            # The section is copied, to swap its bytes
+            swapped = array(typecode, section)
+            section.release()
+            swapped.byteswap()
+            return swapped
+        return section
+
+    @property
+    def kind(self) -> str:
+        """Either "bpe" or "wordpiece"."""
+        return self.header["kind"]
+
+    def __len__(self) -> int:
+        """Number of tokens in the vocabulary."""
+        return len(self._token_offsets) - 1
+
+    def token(self, token_id: int) -> str:
+        """Returns the token of ID `token_id`."""
+        if not 0 <= token_id < len(self):
+            raise IndexError(f"Token ID {token_id} out of range.")
+        start, end = self._token_offsets[token_id], self._token_offsets[token_id + 1]
+        return bytes(self._token_bytes[start:end]).decode("utf-8")
+
+    def tokens(self) -> list[str]:
+        """Returns every token, in the order of their IDs."""
+        token_bytes = self._token_bytes.tobytes()
+        offsets = self._token_offsets.tolist()
+        return [
+            token_bytes[start:end].decode("utf-8")
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+    @property
+    def n_merges(self) -> int:
+        """Number of merges, the first one having rank 0."""
+        return len(self._merges) // 2
+
+    def merge(self, rank: int) -> tuple[str, str]:
+        """Returns the pair of tokens merged with rank `rank`."""
+        if not 0 <= rank < self.n_merges:
+            raise IndexError(f"Merge rank {rank} out of range.")
+        return self.token(self._merges[2 * rank]), self.token(
+            self._merges[2 * rank + 1]
+        )
+
+    def to_tokenizer(self) -> BPETokenizer | WordPieceTokenizer:
+        """Rebuilds the saved tokenizer, ready to encode."""
+        header = self.header
+        tokens = self.tokens()
+        merge_ids = self._merges.tolist()
+        merges = [
+            (tokens[merge_ids[i]], tokens[merge_ids[i + 1]])
+            for i in range(0, len(merge_ids), 2)
+        ]
+
+        if header["kind"] == "bpe":
+            tokenizer = BPETokenizer(
+                base_vocab=tokens[: header["n_base_tokens"]],
+                num_merges=header["num_merges"],
+                unk_token=header["unk_token"],
+                max_cache_size=header["max_cache_size"],
+            )
+            tokenizer.merges = merges
+            tokenizer._build_tables()
+            return tokenizer
+
+        tokenizer = WordPieceTokenizer(
+            vocab_size=header["vocab_size"],
+            initial_vocab=header["initial_vocab"],
+            unk_token=header["unk_token"],
+            max_word_length=header["max_word_length"],
+        )
+        tokenizer.vocab = dict(zip(tokens, range(len(tokens))))
+        tokenizer.merges = merges
+        trie = DoubleArrayTrie.from_arrays(
+            header["trie_alphabet"],
+            self._section("trie_base"),
+            self._section("trie_check"),
+            self._section("trie_value"),
+        )
+        tokenizer._build_trie(trie)
+        return tokenizer
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Fails with a `BufferError` while a WordPiece
+        tokenizer returned by `to_tokenizer` still uses the mapped trie.
+        """
+        for section in (self._token_offsets, self._token_bytes, self._merges):
+            if isinstance(section, memoryview):
+                section.release()
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "TokenizerArtifact":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load_tokenizer(path: str | Path) -> tuple[BPETokenizer | WordPieceTokenizer, dict]:
+    """
+    Loads a tokenizer saved with `save_tokenizer`.
+
+    Returns:
+        A tuple containing:
+            - The tokenizer, ready to encode.
+            - The `preprocessing.preprocess` options saved with it.
+    """
+    artifact = TokenizerArtifact(path)
+    tokenizer = artifact.to_tokenizer()
+    if isinstance(tokenizer, BPETokenizer):
+        # Nothing refers to the mapped file anymore
+        artifact.close()
+    return tokenizer, artifact.preprocess_options
+
+
+# Tests: save and load both tokenizers
+_corpus = [
+    ["hug", "pug", "pun", "bun", "hugs", "caf\xe9"],
+    ["hug", "hug", "pun", "bun", "bun", "hugs", "hugs"],
+    ["hug", "hug", "hug", "hug", "hug", "pun", "pun", "bun", "bun"],
+]
+_options = dict(to_lowercase=True, number_replacement_token="NUM")
+_bpe = BPETokenizer(base_vocab="abcefghnpsu\xe9", num_merges=8)
+_bpe.train(_corpus)
+_wordpiece = WordPieceTokenizer(vocab_size=40)
+_wordpiece.train(_corpus)
+
+with tempfile.TemporaryDirectory() as _tmp_dir:
+    for _tokenizer in (_bpe, _wordpiece):
+        _path = Path(_tmp_dir) / "tokenizer.bin"
+        save_tokenizer(_path, _tokenizer, _options)
+
+        with TokenizerArtifact(_path) as _artifact:
+            assert _artifact.preprocess_options == _options
+            assert len(_artifact) == len(_tokenizer.vocab)
+            assert _artifact.tokens() == list(_tokenizer.vocab)
+            assert _artifact.token(len(_artifact) - 1) == list(_tokenizer.vocab)[-1]
+            assert _artifact.n_merges == len(_tokenizer.merges)
+            assert _artifact.merge(1) == _tokenizer.merges[1]
+
+        _loaded, _loaded_options = load_tokenizer(_path)
+        assert type(_loaded) is type(_tokenizer) and _loaded_options == _options
+        assert _loaded.vocab == _tokenizer.vocab
+        assert _loaded.merges == _tokenizer.merges
+        _words = ["hugs", "caf\xe9", "bug", "unknown"]
+        assert _loaded.encode_batch([_words]) == _tokenizer.encode_batch([_words])
+        del _loaded  # Releases the mapped WordPiece trie
+
+    # The sections stay where the header says whatever the header length, e.g.
+    # when the digits of the offsets make it longer than it was laid out for
+    for _n_tokens in range(1200, 1230):
+        _tokenizer = BPETokenizer(
+            base_vocab=[chr(c) for c in range(0x100, 0x100 + _n_tokens)],
+            num_merges=0,
+        )
+        save_tokenizer(_path, _tokenizer)
+        _loaded, _ = load_tokenizer(_path)
+        assert _loaded.vocab == _tokenizer.vocab, _n_tokens
+
+    _path.write_bytes(b"not a tokenizer")
+    try:
+        TokenizerArtifact(_path)
+        assert False, "ValueError not raised for a file without the magic bytes"
+    except ValueError:
+        pass  # Expected
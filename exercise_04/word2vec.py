@@ -0,0 +1,832 @@
+import abc
+import math
+import random
+import time
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+# --- Sampling ---
+
+
+class AliasTable:
+    """
+    Walker's alias table of a discrete distribution, to draw samples in O(1)
+    each: draw a uniform index, and keep it with its probability, or take its
+    alias otherwise.
+
+    Args:
+        probabilities: The (unnormalized) probability of each index.
+
+    Raises:
+        ValueError: If the probabilities are negative or all zero.
+    """
+
+    def __init__(self, probabilities: Sequence[float] | torch.Tensor):
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if len(probabilities) == 0 or probabilities.min() < 0:
+            raise ValueError("Probabilities must be non-negative.")
+        if probabilities.sum() == 0:
+            raise ValueError("Probabilities cannot all be zero.")
+        n = len(probabilities)
+        scaled = probabilities * (n / probabilities.sum())
+        keep = np.ones(n)
+        alias = np.arange(n)
+        # Vose's method: fill each under-full index with an over-full one
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while small and large:
+            under, over = small.pop(), large[-1]
+            keep[under] = scaled[under]
+            alias[under] = over
+            scaled[over] -= 1 - scaled[under]
+            if scaled[over] < 1:
+                small.append(large.pop())
+        # What is left is 1, up to rounding errors
+        self.keep = torch.from_numpy(keep)
+        self.alias = torch.from_numpy(alias)
+
+    def __len__(self) -> int:
+        return len(self.alias)
+
+    def sample(
+        self, shape: Sequence[int], generator: torch.Generator | None = None
+    ) -> torch.Tensor:
+        """Draws a tensor of indices of the given shape."""
+        indices = torch.randint(len(self), tuple(shape), generator=generator)
+        kept = torch.rand(tuple(shape), generator=generator, dtype=torch.float64)
+        return torch.where(kept < self.keep[indices], indices, self.alias[indices])
+
+
+def word_counts(
+    tokenized_corpus: list[list[str]], word_to_idx: dict[str, int]
+) -> torch.Tensor:
+    """The number of occurrences of each word of the vocabulary."""
+    counts = Counter(word for sentence in tokenized_corpus for word in sentence)
+    result = torch.zeros(len(word_to_idx), dtype=torch.float64)
+    for word, count in counts.items():
+        if word in word_to_idx:
+            result[word_to_idx[word]] = count
+    return result
+
+
+def noise_distribution(counts: torch.Tensor, power: float = 0.75) -> AliasTable:
+    """
+    The distribution negative samples are drawn from: the unigram
+    distribution raised to `power`, which samples rare words more often than
+    their frequency (Mikolov et al., 2013).
+    """
+    return AliasTable(counts.double() ** power)
+
+
+def subsample_corpus(
+    tokenized_corpus: list[list[str]],
+    threshold: float = 1e-3,
+    seed: int | None = None,
+) -> list[list[str]]:
+    """
+    Randomly drops occurrences of frequent words, as in word2vec: a word of
+    frequency f is kept with probability `(sqrt(f / threshold) + 1) *
+    threshold / f`, so words rarer than `threshold` are always kept. This
+    shrinks the training data, and brings rarer words into the windows of the
+    remaining ones.
+
+    Args:
+        tokenized_corpus: The tokens of each sentence.
+        threshold: Frequency above which words get subsampled (1e-3 to 1e-5).
+        seed: Seed of the random generator.
+
+    Returns:
+        The tokens of each sentence, without the dropped occurrences.
+    """
+    counts = Counter(word for sentence in tokenized_corpus for word in sentence)
+    n_words = sum(counts.values())
+    keep_probabilities = {}
+    for word, count in counts.items():
+        frequency = count / n_words
+        keep_probabilities[word] = (
+            ((frequency / threshold) ** 0.5 + 1) * threshold / frequency
+        )
+    rng = random.Random(seed)
+    return [
+        [word for word in sentence if rng.random() < keep_probabilities[word]]
+        for sentence in tokenized_corpus
+    ]
+
+
+# --- Training data ---
+
+
+class _TokenBuffer(Dataset):
+    """
+    A corpus stored as one int32 array of token IDs, with the offsets of its
+    documents, from which the training examples are computed by index
+    arithmetic instead of being stored.
+
+    With `dynamic_window`, the window of each position is drawn uniformly
+    between 1 and `context_size`, like in word2vec (closer words are then
+    more often in the context), and `resample_windows` draws new ones, e.g.
+    at each epoch.
+    """
+
+    def __init__(
+        self,
+        tokenized_corpus: Iterable[list[str]],
+        word_to_idx: dict[str, int],
+        context_size: int,
+        dynamic_window: bool = False,
+        seed: int | None = None,
+    ):
+        if context_size < 1:
+            raise ValueError(f"context_size must be positive, got {context_size}.")
+        token_ids = array("i")
+        lengths = array("q", [0])
+        for sentence in tokenized_corpus:
+            length = len(token_ids)
+            token_ids.extend(word_to_idx[w] for w in sentence if w in word_to_idx)
+            lengths.append(len(token_ids) - length)
+        self.tokens = np.frombuffer(token_ids, dtype=np.int32)
+        self.offsets = np.cumsum(np.frombuffer(lengths, dtype=np.int64))
+        self.context_size = context_size
+        self.dynamic_window = dynamic_window
+        self._rng = np.random.default_rng(seed)
+        self.resample_windows()
+
+    def resample_windows(self) -> None:
+        """Draws the window of each position, with `dynamic_window`."""
+        if self.dynamic_window:
+            # The smallest type that holds the windows (uint8 up to 255)
+            self._windows = self._rng.integers(
+                1,
+                self.context_size + 1,
+                len(self.tokens),
+                dtype=np.min_scalar_type(self.context_size),
+            )
+        else:
+            self._windows = None
+
+    def _windows_of(self, positions: np.ndarray) -> np.ndarray:
+        if self.dynamic_window:
+            return self._windows[positions].astype(np.int64)
+        return np.full_like(positions, self.context_size)
+
+    def _bounds(self, positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """The start and end positions of the documents of some positions."""
+        documents = np.searchsorted(self.offsets, positions, "right") - 1
+        return self.offsets[documents], self.offsets[documents + 1]
+
+    def _positions(self, index) -> np.ndarray:
+        indices = np.asarray(index, dtype=np.int64)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError(f"Index out of range for {len(self)} examples.")
+        return indices
+
+    def loader(
+        self,
+        batch_size: int,
+        shuffle: bool = True,
+        generator: torch.Generator | None = None,
+    ) -> DataLoader:
+        """
+        A `DataLoader` whose sampler yields the indices of a whole batch as a
+        tensor, which `__getitem__` turns into batch tensors at once.
+        """
+        return DataLoader(
+            self,
+            sampler=_IndexBatches(self, batch_size, shuffle, generator),
+            batch_size=None,
+        )
+
+
+class _IndexBatches(Sampler):
+    """
+    Batches of the indices of a dataset, as tensors, shuffled or in order.
+    The length of the dataset is read at each epoch, as it changes when
+    windows are resampled.
+    """
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        batch_size: int,
+        shuffle: bool,
+        generator: torch.Generator | None,
+    ):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = generator
+
+    def __len__(self) -> int:
+        return math.ceil(len(self.dataset) / self.batch_size)
+
+    def __iter__(self) -> Iterator[torch.Tensor]:
+        n = len(self.dataset)
+        if self.shuffle:
+            indices = torch.randperm(n, generator=self.generator)
+        else:
+            indices = torch.arange(n)
+        return iter(indices.split(self.batch_size))
+
+
+class SkipGramPairs(_TokenBuffer):
+    """
+    The (center word, context word) pairs of a corpus, in O(corpus) memory:
+    the pairs are numbered in order of center position, and pair `i` is found
+    with a binary search in the index of the first pair of each position.
+
+    It replaces a list of `(center_word, context_word)` tuples, which takes
+    about 2 x `context_size` Python tuples per word. Indexing it with a list
+    of indices (or a tensor) returns whole batches, see `loader`:
+
+        pairs = SkipGramPairs(tokenized_corpus, word_to_idx, CONTEXT_SIZE)
+        for centers, contexts in pairs.loader(BATCH_SIZE):
+            loss = model.loss(centers, contexts)
+
+    Args:
+        tokenized_corpus: The tokens of each document. Words that are not in
+            `word_to_idx` are skipped.
+        word_to_idx: The ID of each word.
+        context_size: Number of words on each side of the center word.
+        dynamic_window: Whether each position has a random window between 1
+            and `context_size` words.
+        seed: Seed of the random windows.
+    """
+
+    def resample_windows(self) -> None:
+        super().resample_windows()
+        # Index of the first pair of each position
+        positions = np.arange(len(self.tokens))
+        starts, ends = self._bounds(positions)
+        windows = self._windows_of(positions)
+        n_pairs = np.minimum(windows, positions - starts) + np.minimum(
+            windows, ends - 1 - positions
+        )
+        self._first_pairs = np.cumsum(n_pairs) - n_pairs
+        self._n_pairs = int(n_pairs.sum())
+
+    def __len__(self) -> int:
+        return self._n_pairs
+
+    def __getitem__(self, index) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        The IDs of the center and context words of a pair, or of the pairs of
+        a sequence of indices (as tensors of the same shape as `index`).
+        """
+        indices = self._positions(index)
+        centers = np.searchsorted(self._first_pairs, indices, "right") - 1
+        starts, _ = self._bounds(centers)
+        n_left = np.minimum(self._windows_of(centers), centers - starts)
+        # The left context first, then the right context
+        rank = indices - self._first_pairs[centers]
+        contexts = np.where(
+            rank < n_left, centers - n_left + rank, centers + 1 + rank - n_left
+        )
+        return (
+            torch.as_tensor(self.tokens[centers], dtype=torch.long),
+            torch.as_tensor(self.tokens[contexts], dtype=torch.long),
+        )
+
+
+class CBOWWindows(_TokenBuffer):
+    """
+    The (context words, center word) examples of a corpus, one per position,
+    in O(corpus) memory. Context words out of the document or the window are
+    `pad_idx`, like with the padded sentences of the notebook, or with
+    `pad_idx=None`, are left out: the contexts of a batch are then one flat
+    tensor, with the offset of each context in it, as taken by `CBOW`:
+
+        windows = CBOWWindows(tokenized_corpus, word_to_idx, CONTEXT_SIZE, None)
+        for contexts, offsets, centers in windows.loader(BATCH_SIZE):
+            loss = model.loss(contexts, centers, offsets)
+
+    Indexing it with a list of indices (or a tensor) returns whole batches,
+    see `loader`.
+
+    Args:
+        tokenized_corpus: The tokens of each document. Words that are not in
+            `word_to_idx` are skipped.
+        word_to_idx: The ID of each word.
+        context_size: Number of words on each side of the center word.
+        pad_idx: The ID of the padding of the contexts, or None for contexts
+            of variable width.
+        dynamic_window: Whether each position has a random window between 1
+            and `context_size` words.
+        seed: Seed of the random windows.
+    """
+
+    def __init__(
+        self,
+        tokenized_corpus: Iterable[list[str]],
+        word_to_idx: dict[str, int],
+        context_size: int,
+        pad_idx: int | None,
+        dynamic_window: bool = False,
+        seed: int | None = None,
+    ):
+        self.pad_idx = pad_idx
+        super().__init__(
+            tokenized_corpus, word_to_idx, context_size, dynamic_window, seed
+        )
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __getitem__(self, index) -> tuple[torch.Tensor, ...]:
+        """
+        The IDs of the `2 * context_size` context words and of the center
+        word of a position, or of a sequence of positions (with an extra
+        dimension for the context words).
+
+        With `pad_idx=None`, the IDs of the context words of the positions
+        (as one flat tensor), the offset of the context of each position in
+        it, and the IDs of the center words.
+        """
+        centers = self._positions(index)
+        starts, ends = self._bounds(centers)
+        shifts = np.concatenate(
+            [np.arange(-self.context_size, 0), np.arange(1, self.context_size + 1)]
+        )
+        positions = centers[..., None] + shifts
+        valid = (
+            (positions >= starts[..., None])
+            & (positions < ends[..., None])
+            & (np.abs(shifts) <= self._windows_of(centers)[..., None])
+        )
+        if self.pad_idx is None:
+            valid = valid.reshape(-1, len(shifts))
+            n_contexts = valid.sum(1)
+            return (
+                torch.as_tensor(
+                    self.tokens[positions.reshape(valid.shape)[valid]], dtype=torch.long
+                ),
+                torch.as_tensor(np.cumsum(n_contexts) - n_contexts, dtype=torch.long),
+                torch.as_tensor(self.tokens[centers].reshape(-1), dtype=torch.long),
+            )
+        contexts = np.where(
+            valid, self.tokens[np.where(valid, positions, 0)], self.pad_idx
+        )
+        return (
+            torch.as_tensor(contexts, dtype=torch.long),
+            torch.as_tensor(self.tokens[centers], dtype=torch.long),
+        )
+
+
+# --- Models ---
+
+
+class _Word2Vec(nn.Module, metaclass=abc.ABCMeta):
+    """
+    Output layer shared by `CBOW` and `SkipGram`: either a full softmax over
+    the vocabulary, or negative sampling. The subclasses compute the hidden
+    vector of each example from its inputs, in `_hidden`.
+
+    With negative sampling, the output word vectors are an embedding table,
+    and a training example only scores its target word against
+    `negative_samples` words drawn from the noise distribution, i.e.
+    O(negative_samples) per example instead of O(vocab_size). The embedding
+    tables then have sparse gradients, so that an optimizer step only touches
+    the rows of the batch: train them with `torch.optim.SparseAdam` (or SGD),
+    e.g. `SparseAdam(list(model.parameters()))`.
+    """
+
+    def __init__(
+        self,
+        vocab_size: int,
+        embedding_dim: int,
+        negative_samples: int,
+        noise: AliasTable | None,
+    ):
+        super().__init__()
+        self.negative_samples = negative_samples
+        if negative_samples:
+            if noise is None or len(noise) != vocab_size:
+                raise ValueError(
+                    "Negative sampling needs a noise distribution over the vocabulary."
+                )
+            self.noise = noise
+            # Zero output vectors and small input vectors, like in word2vec
+            self.output_embeddings = nn.Embedding(
+                vocab_size, embedding_dim, sparse=True
+            )
+            nn.init.zeros_(self.output_embeddings.weight)
+        else:
+            self.linear = nn.Linear(embedding_dim, vocab_size)
+
+    def _init_input_embeddings(self, embeddings: nn.Embedding) -> None:
+        if self.negative_samples:
+            embeddings.sparse = True
+            bound = 0.5 / embeddings.embedding_dim
+            nn.init.uniform_(embeddings.weight, -bound, bound)
+
+    @abc.abstractmethod
+    def _hidden(
+        self, inputs: torch.Tensor, offsets: torch.Tensor | None
+    ) -> torch.Tensor:
+        """The hidden vector of each example, `(batch, embedding_dim)`."""
+
+    def forward(
+        self, inputs: torch.Tensor, offsets: torch.Tensor | None = None
+    ) -> torch.Tensor:
+        """The score of every word of the vocabulary, `(batch, vocab_size)`."""
+        hidden = self._hidden(inputs, offsets)
+        if self.negative_samples:
+            # Looking every word up, rather than reading the weight matrix,
+            # keeps the gradient of the output vectors sparse for `SparseAdam`
+            words = torch.arange(
+                self.output_embeddings.num_embeddings, device=hidden.device
+            )
+            return hidden @ self.output_embeddings(words).T
+        return self.linear(hidden)
+
+    def loss(
+        self,
+        inputs: torch.Tensor,
+        targets: torch.Tensor,
+        offsets: torch.Tensor | None = None,
+    ) -> torch.Tensor:
+        """
+        The training loss of a batch: the cross-entropy of the full softmax, or
+        the negative sampling loss `-log σ(u_t·h) - Σ log σ(-u_n·h)`, in which
+        the negative samples equal to the target are skipped, like in word2vec.
+
+        Args:
+            inputs: The inputs of the batch, as given to `forward`.
+            targets: The target word of each example, `(batch,)`.
+            offsets: The offsets of the inputs, as given to `forward`.
+        """
+        hidden = self._hidden(inputs, offsets)
+        if not self.negative_samples:
+            return F.cross_entropy(self.linear(hidden), targets)
+        negatives = self.noise.sample((len(targets), self.negative_samples))
+        positive_scores = (self.output_embeddings(targets) * hidden).sum(-1)
+        negative_scores = torch.bmm(
+            self.output_embeddings(negatives), hidden.unsqueeze(-1)
+        ).squeeze(-1)
+        is_target = negatives == targets.unsqueeze(-1)
+        negative_losses = F.logsigmoid(-negative_scores).masked_fill(is_target, 0)
+        return -(F.logsigmoid(positive_scores) + negative_losses.sum(-1)).mean()
+
+
+class CBOW(_Word2Vec):
+    """
+    Continuous bag of words: predicts a word from the sum of the embeddings
+    of its context.
+
+    The contexts are either a `(batch, width)` tensor, or, for contexts of
+    variable width (e.g. at the edges of documents, without padding), one
+    flat tensor of the words of every context with the `offsets` of each
+    context in it, like `nn.EmbeddingBag` (see `CBOWWindows` and
+    `collate_bags`). The sum of each context is then computed by
+    `F.embedding_bag` on the weights of `embedding`, without materializing
+    a `(batch, width, embedding_dim)` tensor.
+
+    Args:
+        vocab_size: Number of words.
+        embedding_dim: Size of the embeddings.
+        negative_samples: Number of negative samples per example for the
+            negative sampling loss, or 0 for the full softmax.
+        noise: The noise distribution of the negative samples, usually
+            `noise_distribution(word_counts(...))`.
+    """
+
+    def __init__(
+        self,
+        vocab_size: int,
+        embedding_dim: int,
+        negative_samples: int = 0,
+        noise: AliasTable | None = None,
+    ):
+        super().__init__(vocab_size, embedding_dim, negative_samples, noise)
+        self.embedding = nn.Embedding(
+            num_embeddings=vocab_size, embedding_dim=embedding_dim
+        )
+        self._init_input_embeddings(self.embedding)
+
+    def _hidden(
+        self, context_idxs: torch.Tensor, offsets: torch.Tensor | None
+    ) -> torch.Tensor:
+        if offsets is None:
+            return torch.sum(self.embedding(context_idxs), dim=1)
+        return F.embedding_bag(
+            context_idxs,
+            self.embedding.weight,
+            offsets,
+            mode="sum",
+            sparse=self.embedding.sparse,
+        )
+
+
+class SkipGram(_Word2Vec):
+    """
+    Skip-gram: predicts the words of the context of a center word from its
+    embedding.
+
+    Args:
+        vocab_size: Number of words.
+        embedding_dim: Size of the embeddings.
+        negative_samples: Number of negative samples per example for the
+            negative sampling loss, or 0 for the full softmax.
+        noise: The noise distribution of the negative samples, usually
+            `noise_distribution(word_counts(...))`.
+    """
+
+    def __init__(
+        self,
+        vocab_size: int,
+        embedding_dim: int,
+        negative_samples: int = 0,
+        noise: AliasTable | None = None,
+    ):
+        super().__init__(vocab_size, embedding_dim, negative_samples, noise)
+        self.embeddings = nn.Embedding(
+            num_embeddings=vocab_size, embedding_dim=embedding_dim
+        )
+        self._init_input_embeddings(self.embeddings)
+
+    def _hidden(
+        self, center_word_idx: torch.Tensor, offsets: torch.Tensor | None
+    ) -> torch.Tensor:
+        if offsets is not None:
+            raise ValueError("SkipGram takes one center word per example.")
+        return self.embeddings(center_word_idx)
+
+
+def collate_bags(
+    samples: list[tuple[torch.Tensor, torch.Tensor]],
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Collates `(context, target)` samples with contexts of variable width into
+    the flat contexts, their offsets and the targets taken by `CBOW`, e.g. as
+    the `collate_fn` of a `DataLoader`.
+    """
+    contexts = [context for context, _ in samples]
+    widths = torch.tensor([len(context) for context in contexts])
+    return (
+        torch.cat(contexts),
+        torch.cumsum(widths, 0) - widths,
+        torch.cat([target.reshape(-1) for _, target in samples]),
+    )
+
+
+def most_similar(
+    embeddings: torch.Tensor, word_idx: int, top_k: int = 10
+) -> list[tuple[int, float]]:
+    """
+    The `top_k` words whose embeddings have the largest cosine similarity
+    with the embedding of a word (itself excluded), like `find_most_similar`
+    in the notebook.
+
+    Returns:
+        The index and similarity of each word, most similar first.
+    """
+    with torch.no_grad():
+        similarities = F.cosine_similarity(
+            embeddings[word_idx].unsqueeze(0), embeddings, dim=1
+        )
+        similarities[word_idx] = -torch.inf
+        top = torch.topk(similarities, k=min(top_k, len(embeddings) - 1))
+    return list(zip(top.indices.tolist(), top.values.tolist()))
+
+
+# Tests for AliasTable
+_table = AliasTable([1, 0, 3, 4])
+_samples = _table.sample((40_000,), generator=torch.Generator().manual_seed(0))
+assert _samples.shape == (40_000,) and _samples.dtype == torch.int64
+assert torch.allclose(
+    torch.bincount(_samples, minlength=4) / 40_000,
+    torch.tensor([0.125, 0, 0.375, 0.5]),
+    atol=0.01,
+)
+assert (AliasTable([0, 2]).sample((100,)) == 1).all()
+for _bad_probabilities in [[], [0, 0], [1, -1]]:
+    try:
+        AliasTable(_bad_probabilities)
+        assert False, "ValueError not raised"
+    except ValueError:
+        pass  # Expected
+
+_counts = word_counts([["a", "b", "a"], ["c", "a"]], {"a": 0, "b": 1, "<PAD>": 2})
+assert _counts.tolist() == [3, 1, 0]
+_samples = noise_distribution(_counts).sample((40_000,))
+assert torch.allclose(
+    torch.bincount(_samples, minlength=3) / 40_000,
+    torch.tensor([3**0.75 / (3**0.75 + 1), 1 / (3**0.75 + 1), 0]),
+    atol=0.01,
+)
+
+# Tests for subsample_corpus: frequent words are dropped, rare ones kept
+_corpus = [["the"] * 90 + ["cat"]] * 10
+_subsampled = subsample_corpus(_corpus, threshold=0.05, seed=0)
+assert all(_sentence.count("cat") == 1 for _sentence in _subsampled)
+_kept = sum(_sentence.count("the") for _sentence in _subsampled) / 900
+assert abs(_kept - (((0.9 / 0.05) ** 0.5 + 1) * 0.05 / 0.9)) < 0.05
+assert subsample_corpus(_corpus, threshold=1) == _corpus
+
+
+def _train_on_topics(model: _Word2Vec, steps: int, seed: int = 0) -> None:
+    """
+    Trains a model on windows of 5 words drawn from one of 4 topics of 5
+    words each, which share no words.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    for _ in range(steps):
+        topics = torch.randint(4, (256, 1), generator=generator)
+        windows = topics * 5 + torch.randint(5, (256, 5), generator=generator)
+        if isinstance(model, SkipGram):
+            model.loss(windows[:, 0], windows[:, 1]).backward()
+        else:
+            model.loss(windows[:, 1:], windows[:, 0]).backward()
+        # Plain SGD (creating a torch optimizer takes seconds the first time)
+        with torch.no_grad():
+            for parameter in model.parameters():
+                parameter -= 2 * parameter.grad
+                parameter.grad = None
+
+
+# With negative sampling, the nearest neighbours of each word are the other
+# words of its topic, and the top predictions are the words of the topic
+torch.manual_seed(0)
+_noise = noise_distribution(torch.ones(20))
+_skip_gram = SkipGram(20, 8, negative_samples=5, noise=_noise)
+_cbow = CBOW(20, 8, negative_samples=5, noise=_noise)
+for _model, _embeddings, _inputs in [
+    (_skip_gram, _skip_gram.embeddings, torch.arange(20)),
+    (
+        _cbow,
+        _cbow.embedding,
+        torch.arange(20).view(4, 5)[:, :4].repeat_interleave(5, 0),
+    ),
+]:
+    _train_on_topics(_model, steps=100)
+    for _word in range(20):
+        _neighbours = most_similar(_embeddings.weight, _word, top_k=4)
+        assert all(_idx // 5 == _word // 5 for _idx, _ in _neighbours)
+    with torch.no_grad():
+        _predictions = torch.topk(_model(_inputs), 5).indices
+    assert (_predictions // 5 == torch.arange(20).view(20, 1) // 5).all()
+
+# Backpropagating through the scores of `forward` keeps the gradients sparse
+_skip_gram(torch.arange(3)).sum().backward()
+assert all(_parameter.grad.is_sparse for _parameter in _skip_gram.parameters())
+
+try:
+    SkipGram(10, 8, negative_samples=5)
+    assert False, "ValueError not raised without a noise distribution"
+except ValueError:
+    pass  # Expected
+
+# Negative samples equal to the target do not count: with zero output vectors,
+# each counted sample adds log(2) to the loss
+_skip_gram = SkipGram(3, 4, negative_samples=4, noise=AliasTable([1, 1, 0]))
+_losses = [
+    _skip_gram.loss(torch.tensor([2] * 1000), torch.tensor([target] * 1000))
+    for target in [0, 2]
+]
+assert abs(_losses[0].item() / np.log(2) - 3) < 0.1  # Half of 4 are the target
+assert abs(_losses[1].item() / np.log(2) - 5) < 1e-5  # None is the target
+
+try:
+    _Word2Vec(10, 8, 0, None)
+    assert False, "TypeError not raised for the abstract base class"
+except TypeError:
+    pass  # Expected
+
+
+# Tests for SkipGramPairs and CBOWWindows
+_corpus = [["a", "b", "c", "d"], [], ["e"], ["f", "unknown", "g"]]
+_word_to_idx = {word: i for i, word in enumerate("abcdefg")} | {"<PAD>": 7}
+
+
+def _padded_pairs(corpus: list[list[str]], context_size: int) -> list[tuple]:
+    """The pairs of the notebook, without the ones with the padding."""
+    return [
+        (_word_to_idx[sentence[i]], _word_to_idx[sentence[j]])
+        for sentence in corpus
+        for i in range(len(sentence))
+        for j in range(i - context_size, i + context_size + 1)
+        if j != i and 0 <= j < len(sentence)
+    ]
+
+
+_known_corpus = [[w for w in s if w in _word_to_idx] for s in _corpus]
+for _context_size in [1, 2, 5]:
+    _pairs = SkipGramPairs(_corpus, _word_to_idx, _context_size)
+    _centers, _contexts = _pairs[list(range(len(_pairs)))]
+    assert sorted(zip(_centers.tolist(), _contexts.tolist())) == sorted(
+        _padded_pairs(_known_corpus, _context_size)
+    )
+assert [t.tolist() for t in SkipGramPairs(_corpus, _word_to_idx, 1)[2]] == [1, 2]
+assert SkipGramPairs(_corpus, _word_to_idx, 1)[torch.tensor([[0, 1]])][0].shape == (
+    1,
+    2,
+)
+
+_windows = CBOWWindows(_corpus, _word_to_idx, 2, pad_idx=7)
+assert len(_windows) == 7
+_contexts, _centers = _windows[[0, 2, 4, 6]]
+assert _centers.tolist() == [0, 2, 4, 6]
+assert _contexts.tolist() == [[7, 7, 1, 2], [0, 1, 3, 7], [7, 7, 7, 7], [7, 5, 7, 7]]
+_contexts, _offsets, _centers = CBOWWindows(_corpus, _word_to_idx, 2, None)[
+    [0, 2, 4, 6]
+]
+assert _contexts.tolist() == [1, 2, 0, 1, 3, 5] and _offsets.tolist() == [0, 2, 5, 5]
+assert _centers.tolist() == [0, 2, 4, 6]
+assert [
+    _t.tolist()
+    for _t in collate_bags(
+        [
+            (torch.tensor([1, 2]), torch.tensor([0])),
+            (torch.tensor([3]), torch.tensor([2])),
+        ]
+    )
+] == [[1, 2, 3], [0, 2], [0, 2]]
+
+# CBOW sums the same embeddings with padded contexts, or with offsets
+_model = CBOW(8, 4)
+_padded = torch.tensor([[1, 2, 3], [4, 5, 6]])
+_expected = _model.embedding(_padded).sum(1)
+assert torch.equal(_model._hidden(_padded, None), _expected)
+assert torch.allclose(
+    _model(torch.tensor([1, 2, 3, 4, 5, 6]), torch.tensor([0, 3])), _model(_padded)
+)
+_loss = CBOW(8, 4, negative_samples=2, noise=noise_distribution(torch.ones(8))).loss(
+    torch.tensor([1, 2, 3]), torch.tensor([0, 4]), torch.tensor([0, 1])
+)
+_loss.backward()
+
+# Dynamic windows: each center only has the pairs of its window
+_pairs = SkipGramPairs(
+    [list("abcdefg") * 20], _word_to_idx, 3, dynamic_window=True, seed=0
+)
+_centers, _contexts = _pairs[torch.arange(len(_pairs))]
+_positions = np.repeat(
+    np.arange(140), np.diff(np.append(_pairs._first_pairs, len(_pairs)))
+)
+_expected = [
+    (i, j)
+    for i in range(140)
+    for j in range(i - int(_pairs._windows[i]), i + int(_pairs._windows[i]) + 1)
+    if j != i and 0 <= j < 140
+]
+assert list(zip(_positions.tolist(), _centers.tolist())) == [
+    (i, i % 7) for i, _ in _expected
+]
+assert _contexts.tolist() == [j % 7 for _, j in _expected]
+assert 1 <= _pairs._windows.min() and _pairs._windows.max() == 3
+_n_pairs = len(_pairs)
+_loader = _pairs.loader(100)
+_pairs.resample_windows()
+assert len(_pairs) != _n_pairs
+assert sum(len(_centers) for _centers, _ in _loader) == len(_pairs)
+assert (
+    torch.cat([_contexts for _, _contexts in _loader])
+    .sort()
+    .values.equal(_pairs[torch.arange(len(_pairs))][1].sort().values)
+)
+
+# Windows wider than 127 (which do not fit in an int8)
+_pairs = SkipGramPairs(
+    [list("abcdefg") * 50], _word_to_idx, 300, dynamic_window=True, seed=0
+)
+assert _pairs._windows.max() > 127 and len(_pairs) > 0
+
+_batches = list(SkipGramPairs(_corpus, _word_to_idx, 1).loader(3, shuffle=False))
+assert [len(_centers) for _centers, _ in _batches] == [3, 3, 2]
+try:
+    SkipGramPairs(_corpus, _word_to_idx, 1)[8]
+    assert False, "IndexError not raised"
+except IndexError:
+    pass  # Expected
+
+
+if __name__ == "__main__":
+    # Training throughput of skip-gram with a 50k vocabulary
+    vocab_size, batch_size, n_batches = 50_000, 128, 50
+    counts = 1 / torch.arange(1, vocab_size + 1, dtype=torch.float64)
+    noise = noise_distribution(counts)
+    centers = noise.sample((n_batches, batch_size))
+    contexts = noise.sample((n_batches, batch_size))
+    full_softmax = SkipGram(vocab_size, 100)
+    negative_sampling = SkipGram(vocab_size, 100, negative_samples=5, noise=noise)
+    for name, model, optimizer in [
+        ("full softmax", full_softmax, torch.optim.Adam(full_softmax.parameters())),
+        (
+            "negative sampling",
+            negative_sampling,
+            torch.optim.SparseAdam(list(negative_sampling.parameters())),
+        ),
+    ]:
+        start = time.perf_counter()
+        for center, context in zip(centers, contexts):
+            optimizer.zero_grad()
+            model.loss(center, context).backward()
+            optimizer.step()
+        seconds = time.perf_counter() - start
+        print(f"{name}: {n_batches * batch_size / seconds:,.0f} examples/s")